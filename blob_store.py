@@ -0,0 +1,132 @@
+import gzip
+import os
+import re
+import tempfile
+import time
+import zipfile
+
+# Cookie bodies live here as gzip files named after the SHA-256 of their
+# content (ab/cdef...gz), so the database only holds the hash.
+BLOB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "blobs")
+BLOB_COMPRESS_LEVEL = 6
+BACKUP_PREFIX = "blobs/"  # where blobs go inside a backup zip (see db.write_backup)
+_BACKUP_NAME = re.compile(r"blobs/([0-9a-f]{2})/([0-9a-f]{62})\.gz")
+
+
+def _path(digest):
+    name = digest.hex()
+    return os.path.join(BLOB_DIR, name[:2], name[2:] + ".gz")
+
+
+def put(digest, data):
+    """
+    Store data (str or bytes) under its digest. Writing a blob that already
+    exists only refreshes its modification time (see collect()).
+    """
+    path = _path(digest)
+    try:
+        os.utime(path)
+        return
+    except FileNotFoundError:
+        pass
+    if isinstance(data, str):
+        data = data.encode("utf-8", errors="surrogatepass")
+    _write(path, gzip.compress(data, BLOB_COMPRESS_LEVEL, mtime=0))
+
+
+def _write(path, compressed):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def open_blob(digest, name=None):
+    """
+    Open a blob for reading; the returned file object decompresses on the fly.
+    name, if given, becomes the file name seen by uploads (e.g. send_document).
+    Raises FileNotFoundError if it was never stored or has been collected.
+    """
+    f = gzip.open(_path(digest), "rb")
+    if name:
+        f.name = name
+    return f
+
+
+def iter_blobs():
+    """
+    Yield (digest, path, mtime) for every stored blob.
+    """
+    if not os.path.isdir(BLOB_DIR):
+        return
+    for prefix in os.scandir(BLOB_DIR):
+        if not prefix.is_dir():
+            continue
+        for entry in os.scandir(prefix.path):
+            if not entry.name.endswith(".gz"):
+                continue
+            try:
+                digest = bytes.fromhex(prefix.name + entry.name[:-3])
+                yield digest, entry.path, entry.stat().st_mtime
+            except (ValueError, OSError):
+                continue
+
+
+def collect(live, grace):
+    """
+    Delete every blob whose digest is not in live and that has not been
+    written or re-referenced in the last grace seconds (so blobs of an upload
+    still in progress survive). Returns (blobs deleted, bytes freed).
+    """
+    cutoff = time.time() - grace
+    deleted = freed = 0
+    for digest, path, mtime in iter_blobs():
+        if digest in live or mtime > cutoff:
+            continue
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except OSError:
+            continue
+        deleted += 1
+        freed += size
+    return deleted, freed
+
+
+def add_to_zip(zf):
+    """
+    Add every stored blob to an open ZipFile under BACKUP_PREFIX, as is
+    (already compressed). Returns the number of blobs added.
+    """
+    count = 0
+    for digest, path, _ in iter_blobs():
+        name = digest.hex()
+        try:
+            zf.write(path, f"{BACKUP_PREFIX}{name[:2]}/{name[2:]}.gz", compress_type=zipfile.ZIP_STORED)
+        except OSError:
+            continue
+        count += 1
+    return count
+
+
+def extract_from_zip(zf):
+    """
+    Write the blobs of a backup zip into BLOB_DIR; other members are ignored.
+    Blobs not in the backup are left to collect(). Returns the number restored.
+    """
+    count = 0
+    for name in zf.namelist():
+        match = _BACKUP_NAME.fullmatch(name)
+        if not match:
+            continue
+        _write(_path(bytes.fromhex(match.group(1) + match.group(2))), zf.read(name))
+        count += 1
+    return count
@@ -0,0 +1,72 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+import config
+from dispatcher import LaneBot
+
+# Outbound HTTP settings shared by every module that talks to Telegram.
+HTTP_POOL_SIZE = 32       # keep-alive connections kept open to api.telegram.org
+HTTP_MAX_RETRIES = 2      # retries on connection errors (not on HTTP errors)
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 30
+
+_bot = None
+_bot_lock = threading.Lock()
+_stats = {"requests": 0, "errors": 0, "total_seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+def _record_response(response, *args, **kwargs):
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["total_seconds"] += response.elapsed.total_seconds()
+        if response.status_code >= 400:
+            _stats["errors"] += 1
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE,
+                          max_retries=HTTP_MAX_RETRIES)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(_record_response)
+    return session
+
+
+def get_bot():
+    """
+    Return the process-wide TeleBot. Every Telegram call made through it (from
+    any module or thread) goes over one pooled keep-alive HTTP session, and
+    incoming updates are dispatched on per-user lanes.
+    """
+    global _bot
+    if _bot is None:
+        with _bot_lock:
+            if _bot is None:
+                apihelper.session = _build_session()
+                apihelper.CONNECT_TIMEOUT = HTTP_CONNECT_TIMEOUT
+                apihelper.READ_TIMEOUT = HTTP_READ_TIMEOUT
+                # Needed for the request-context middleware in main.py
+                apihelper.ENABLE_MIDDLEWARE = True
+                # Handlers run on per-user lanes (see dispatcher.py), not telebot's pool
+                _bot = LaneBot(config.TOKEN, parse_mode="HTML", threaded=False)
+    return _bot
+
+
+def get_session():
+    """
+    The pooled HTTP session behind get_bot(), for raw downloads (e.g. streaming files).
+    """
+    get_bot()
+    return apihelper.session
+
+
+def stats():
+    """
+    Outbound request counters: total requests, HTTP error responses and
+    cumulative time spent waiting on Telegram.
+    """
+    with _stats_lock:
+        return dict(_stats)
@@ -18,3 +18,15 @@ LOGS_CHANNEL = "@ShadowBotLogs"
 
 DEFAULT_ACCOUNT_CLAIM_COST = 2 
 DEFAULT_REFERRAL_BONUS = 10    
+
+# Update intake. Leave WEBHOOK_ENABLED off to long-poll (the default).
+# With it on and WEBHOOK_URL empty, the server runs without registering with
+# Telegram, for local testing with recorded updates (see webhook.py).
+WEBHOOK_ENABLED = False
+WEBHOOK_URL = ""              # public HTTPS URL Telegram should call, e.g. "https://bot.example.com/webhook"
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET = ""           # sent by Telegram in X-Telegram-Bot-Api-Secret-Token; random per run if empty
+WEBHOOK_WORKERS = 8
+WEBHOOK_QUEUE_SIZE = 1000
@@ -1,18 +1,160 @@
 import sqlite3
+import io
 import os
+import hashlib
+import itertools
+import threading
+import weakref
+import time
+import zipfile
+from collections import OrderedDict
 from datetime import datetime
 import json
-import telebot
 import config
+import blob_store
+from records import User, Platform, StockItem, Key, Admin
 from handlers.logs import log_event
+from bot_client import get_bot
 
 DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bot.db")
 
+# Connection tuning. Every thread keeps one long-lived connection, so these
+# pragmas are paid once per thread instead of once per query.
+DB_TIMEOUT = 30                   # seconds to wait on a locked database
+DB_CACHE_SIZE_KB = 16384          # page cache per connection
+DB_MMAP_SIZE = 256 * 1024 * 1024  # memory-mapped I/O window
+DB_STATEMENT_CACHE = 256          # prepared statements kept per connection
+
+# Hot statements prepared as soon as a connection opens so the first real
+# request on a thread does not pay for compiling them.
+_WARM_STATEMENTS = [
+    ("SELECT * FROM users WHERE telegram_id = ?", ("",)),
+    ("SELECT config_value FROM configurations WHERE config_key = ?", ("",)),
+    ("SELECT * FROM admins", ()),
+    ("SELECT * FROM platforms WHERE platform_name = ?", ("",)),
+]
+
+_local = threading.local()
+# Weak references only: a thread's connection is freed (and any transaction
+# it left open rolled back) once the thread exits.
+_connections = weakref.WeakSet()
+_connections_lock = threading.Lock()
+_generation = 0
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Thread-local connection that survives close().
+    Callers keep the usual get_connection() / conn.close() pattern; close() only
+    ends the caller's use of it. release() really closes it.
+    """
+
+    def close(self):
+        pass
+
+    def release(self):
+        super().close()
+
+def _open_connection():
+    con = sqlite3.connect(DATABASE, timeout=DB_TIMEOUT, factory=PooledConnection,
+                          cached_statements=DB_STATEMENT_CACHE, check_same_thread=False)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA synchronous = NORMAL")
+    con.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    con.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    con.execute("PRAGMA temp_store = MEMORY")
+    for sql, params in _WARM_STATEMENTS:
+        try:
+            con.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            # Tables do not exist yet (first run before init_db).
+            pass
+    return con
+
 def get_connection():
-    con = sqlite3.connect(DATABASE)
+    con = getattr(_local, "conn", None)
+    if con is None or _local.generation != _generation:
+        con = _open_connection()
+        with _connections_lock:
+            _connections.add(con)
+            _local.conn, _local.generation = con, _generation
     con.row_factory = sqlite3.Row
     return con
 
+def rollback_open_transaction():
+    """
+    Roll back whatever the calling thread's connection left uncommitted (a
+    helper that raised between a write and its commit). Worker threads call
+    this after each unit of work so a failed handler cannot keep the write lock.
+    """
+    con = getattr(_local, "conn", None)
+    if con is not None and con.in_transaction:
+        try:
+            con.rollback()
+        except sqlite3.Error as e:
+            print(f"Error rolling back connection: {e}")
+
+def close_all_connections():
+    """
+    Really close every pooled connection (all threads). Used before the database
+    file is replaced or shipped, and on shutdown. Threads reconnect on next use.
+    """
+    global _generation
+    with _connections_lock:
+        for con in list(_connections):
+            try:
+                con.release()
+            except sqlite3.Error as e:
+                print(f"Error closing connection: {e}")
+        _connections.clear()
+        _generation += 1
+    invalidate_config_cache()
+    invalidate_admin_cache()
+    invalidate_leaderboard()
+    invalidate_platform_catalog()
+    invalidate_user_cache()
+
+def checkpoint():
+    """
+    Fold the WAL file back into the main database file so bot.db is complete on its own.
+    """
+    conn = get_connection()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+BACKUP_DB_NAME = "bot.db"  # the database inside a backup zip
+
+def write_backup(f):
+    """
+    Write a backup zip (the database plus every cookie blob, which the
+    database only references by hash) to the file object or path f.
+    Returns the number of blobs included.
+    """
+    checkpoint()
+    with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.write(DATABASE, BACKUP_DB_NAME)
+        return blob_store.add_to_zip(zf)
+
+def restore_backup(data):
+    """
+    Replace the database with a backup: a zip from write_backup, or a bare
+    database file (older backups). The database is migrated to the current
+    schema before anything uses it. Returns the number of blobs restored.
+    """
+    archive = None
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        data = archive.read(BACKUP_DB_NAME)
+    # Drop the pooled connections and stale WAL files before swapping the file.
+    close_all_connections()
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(DATABASE + suffix):
+            os.remove(DATABASE + suffix)
+    with open(DATABASE, "wb") as f:
+        f.write(data)
+    blobs = blob_store.extract_from_zip(archive) if archive is not None else 0
+    init_db()
+    return blobs
+
 def init_db():
     conn = get_connection()
     c = conn.cursor()
@@ -26,7 +168,8 @@ def init_db():
         referrals INTEGER DEFAULT 0,
         banned INTEGER DEFAULT 0,
         pending_referrer TEXT,
-        verified INTEGER DEFAULT 0
+        verified INTEGER DEFAULT 0,
+        blocked_bot INTEGER DEFAULT 0
     )
     ''')
     # Create reports table for tracking report status (claimed, closed)
@@ -56,9 +199,25 @@ def init_db():
             platform_name TEXT PRIMARY KEY,
             stock TEXT,
             price INTEGER DEFAULT {config.DEFAULT_ACCOUNT_CLAIM_COST},
-            platform_type TEXT DEFAULT 'account'
+            platform_type TEXT DEFAULT 'account',
+            stock_count INTEGER DEFAULT 0
+        )
+    ''')
+    # Create stock items table (one row per account line or cookie file)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS stock_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            platform_name TEXT NOT NULL,
+            item_type TEXT DEFAULT 'account',  -- 'account', 'cookie'
+            content TEXT,       -- NULL for cookies: the body is in blob_store under content_hash
+            content_hash BLOB,  -- SHA-256 of the normalized content, unique per platform
+            claimed INTEGER DEFAULT 0,
+            claimed_by TEXT,
+            claimed_at DATETIME,
+            added_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_stock_items_available ON stock_items (platform_name, claimed, id)")
     # Create reviews table
     c.execute('''
         CREATE TABLE IF NOT EXISTS reviews (
@@ -111,26 +270,333 @@ def init_db():
             config_value TEXT
         )
     ''')
+    # Create stock uploads table (per-file progress so a retried upload resumes instead of duplicating)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS stock_uploads (
+            upload_id TEXT PRIMARY KEY,
+            platform_name TEXT,
+            items_done INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'running',  -- 'running', 'done'
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Create stats table (dashboard counters kept current by triggers)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER DEFAULT 0
+        )
+    ''')
+    # Create broadcast jobs table (progress is saved so a job can resume after a restart)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id TEXT,
+            chat_id TEXT,
+            text TEXT,
+            status TEXT DEFAULT 'running',  -- 'running', 'done'
+            last_user_id TEXT DEFAULT '',
+            delivered INTEGER DEFAULT 0,
+            blocked INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            progress_message_id INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
 
     conn.commit()
     c.close()
     conn.close()
     migrate_db()
 
+# Secondary indexes for the hot lookups (created by migrate_db).
+_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_reports_user_status ON reports (user_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_referrals_referred ON referrals (referred_id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_points ON users (points DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_keys_claimed_type ON keys (claimed, type)",
+    "CREATE INDEX IF NOT EXISTS idx_users_username ON users (username COLLATE NOCASE)",
+    # Partial indexes for the blob store: cookie rows already moved out (blob
+    # GC) and those still stored inline (migration; empty once it has run).
+    "CREATE INDEX IF NOT EXISTS idx_stock_items_cookie_blobs ON stock_items (content_hash, claimed, claimed_at) "
+    "WHERE item_type = 'cookie' AND content IS NULL",
+    "CREATE INDEX IF NOT EXISTS idx_stock_items_inline_cookies ON stock_items (id) "
+    "WHERE item_type = 'cookie' AND content IS NOT NULL AND content_hash IS NOT NULL",
+]
+
+# Dashboard counters in the stats table, maintained by triggers on every write
+# to users and keys so get_admin_dashboard() never aggregates.
+STAT_NAMES = ("total_users", "banned_users", "verified_users", "total_points", "outstanding_keys")
+STATS_RECONCILE_INTERVAL = 6 * 60 * 60  # seconds between consistency checks
+BLOB_GC_INTERVAL = 6 * 60 * 60  # seconds between cookie blob collections
+BLOB_GC_GRACE = 24 * 60 * 60    # claimed cookies stay downloadable (and refundable) this long
+
+_STATS_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users
+    BEGIN
+        UPDATE stats SET value = value + 1 WHERE name = 'total_users';
+        UPDATE stats SET value = value + (IFNULL(NEW.banned, 0) != 0) WHERE name = 'banned_users';
+        UPDATE stats SET value = value + (IFNULL(NEW.verified, 0) != 0) WHERE name = 'verified_users';
+        UPDATE stats SET value = value + IFNULL(NEW.points, 0) WHERE name = 'total_points';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_users_delete AFTER DELETE ON users
+    BEGIN
+        UPDATE stats SET value = value - 1 WHERE name = 'total_users';
+        UPDATE stats SET value = value - (IFNULL(OLD.banned, 0) != 0) WHERE name = 'banned_users';
+        UPDATE stats SET value = value - (IFNULL(OLD.verified, 0) != 0) WHERE name = 'verified_users';
+        UPDATE stats SET value = value - IFNULL(OLD.points, 0) WHERE name = 'total_points';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_users_points AFTER UPDATE OF points ON users
+    WHEN NEW.points IS NOT OLD.points
+    BEGIN
+        UPDATE stats SET value = value + IFNULL(NEW.points, 0) - IFNULL(OLD.points, 0) WHERE name = 'total_points';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_users_banned AFTER UPDATE OF banned ON users
+    WHEN (IFNULL(NEW.banned, 0) != 0) != (IFNULL(OLD.banned, 0) != 0)
+    BEGIN
+        UPDATE stats SET value = value + (IFNULL(NEW.banned, 0) != 0) - (IFNULL(OLD.banned, 0) != 0) WHERE name = 'banned_users';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_users_verified AFTER UPDATE OF verified ON users
+    WHEN (IFNULL(NEW.verified, 0) != 0) != (IFNULL(OLD.verified, 0) != 0)
+    BEGIN
+        UPDATE stats SET value = value + (IFNULL(NEW.verified, 0) != 0) - (IFNULL(OLD.verified, 0) != 0) WHERE name = 'verified_users';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_keys_insert AFTER INSERT ON keys
+    WHEN NEW.claimed = 0
+    BEGIN
+        UPDATE stats SET value = value + 1 WHERE name = 'outstanding_keys';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_keys_claimed AFTER UPDATE OF claimed ON keys
+    WHEN (NEW.claimed = 0) != (OLD.claimed = 0)
+    BEGIN
+        UPDATE stats SET value = value + (NEW.claimed = 0) - (OLD.claimed = 0) WHERE name = 'outstanding_keys';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_keys_delete AFTER DELETE ON keys
+    WHEN OLD.claimed = 0
+    BEGIN
+        UPDATE stats SET value = value - 1 WHERE name = 'outstanding_keys';
+    END;
+'''
+
+def _aggregate_stats(c):
+    c.execute("""
+        SELECT COUNT(*), COALESCE(SUM(banned != 0), 0), COALESCE(SUM(verified != 0), 0), COALESCE(SUM(points), 0)
+        FROM users
+    """)
+    total_users, banned_users, verified_users, total_points = c.fetchone()
+    c.execute("SELECT COUNT(*) FROM keys WHERE claimed = 0")
+    outstanding_keys = c.fetchone()[0]
+    return {
+        "total_users": total_users,
+        "banned_users": banned_users,
+        "verified_users": verified_users,
+        "total_points": total_points,
+        "outstanding_keys": outstanding_keys,
+    }
+
+def reconcile_stats():
+    """
+    Recompute the dashboard counters and each platform's stock_count from the
+    real tables and fix any drift. Returns {name: (counter, actual)} for every
+    counter that was wrong; stock counts appear as 'stock_count:<platform>'.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        actual = _aggregate_stats(c)
+        c.execute("SELECT name, value FROM stats")
+        stored = {row[0]: row[1] for row in c.fetchall()}
+        drift = {name: (stored.get(name), value) for name, value in actual.items() if stored.get(name) != value}
+        c.executemany("REPLACE INTO stats (name, value) VALUES (?, ?)", list(actual.items()))
+        c.execute("""
+            SELECT platform_name, stock_count,
+                   (SELECT COUNT(*) FROM stock_items
+                    WHERE stock_items.platform_name = platforms.platform_name AND claimed = 0)
+            FROM platforms
+        """)
+        stock_drift = [tuple(row) for row in c.fetchall() if row[1] != row[2]]
+        c.executemany("UPDATE platforms SET stock_count = ? WHERE platform_name = ?",
+                      [(actual_count, platform_name) for platform_name, _, actual_count in stock_drift])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        c.close()
+    if stock_drift:
+        invalidate_platform_catalog()
+    for platform_name, counter, actual_count in stock_drift:
+        drift[f"stock_count:{platform_name}"] = (counter, actual_count)
+    return drift
+
+def start_stats_reconciler(interval=STATS_RECONCILE_INTERVAL):
+    """
+    Run reconcile_stats() every interval seconds on a daemon thread.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                drift = reconcile_stats()
+                if drift:
+                    print(f"[WARN] Dashboard/stock counters drifted and were corrected: {drift}")
+            except Exception as e:
+                print(f"Error reconciling counters: {e}")
+                rollback_open_transaction()
+    threading.Thread(target=run, name="stats-reconciler", daemon=True).start()
+
+def collect_stock_blobs(grace=BLOB_GC_GRACE):
+    """
+    Delete cookie blobs no longer needed: those of items claimed more than
+    grace seconds ago and of items removed from stock. Returns (blobs
+    deleted, bytes freed).
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT DISTINCT content_hash FROM stock_items
+        WHERE item_type = 'cookie' AND content IS NULL AND (claimed = 0 OR claimed_at > ?)
+    """, (datetime.fromtimestamp(time.time() - grace),))
+    live = {row[0] for row in c.fetchall()}
+    c.close()
+    return blob_store.collect(live, grace)
+
+def start_blob_gc(interval=BLOB_GC_INTERVAL):
+    """
+    Run collect_stock_blobs() every interval seconds on a daemon thread.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                deleted, freed = collect_stock_blobs()
+                if deleted:
+                    print(f"Collected {deleted} cookie blobs ({freed // 1024} KB).")
+            except Exception as e:
+                print(f"Error collecting cookie blobs: {e}")
+                rollback_open_transaction()
+    threading.Thread(target=run, name="blob-gc", daemon=True).start()
+
+def _move_cookies_to_blobs(conn, chunk_size=1000):
+    """
+    Move cookie bodies still stored inline in stock_items into blob_store.
+    """
+    while True:
+        rows = conn.execute("""
+            SELECT id, content, content_hash FROM stock_items
+            WHERE item_type = 'cookie' AND content IS NOT NULL AND content_hash IS NOT NULL LIMIT ?
+        """, (chunk_size,)).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            blob_store.put(row["content_hash"], row["content"])
+        with conn:
+            conn.executemany("UPDATE stock_items SET content = NULL WHERE id = ?", ((row["id"],) for row in rows))
+
+def _backfill_stock_hashes(conn, chunk_size=5000):
+    """
+    Hash stock rows created before content_hash existed. Rows whose content is
+    already present for the platform keep a NULL hash (they are old duplicates).
+    """
+    last_id = 0
+    while True:
+        rows = conn.execute("SELECT id, item_type, content FROM stock_items WHERE id > ? ORDER BY id LIMIT ?",
+                            (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        with conn:
+            conn.executemany("UPDATE OR IGNORE stock_items SET content_hash = ? WHERE id = ?",
+                             ((stock_content_hash(row["content"]), row["id"]) for row in rows))
+        last_id = rows[-1]["id"]
+
 def migrate_db():
     """
-    Check if the 'platforms' table has the 'platform_type' column.
-    If not, add it via an ALTER TABLE command.
+    Bring an existing database up to the current schema:
+      - add the 'platform_type' and 'stock_count' columns to 'platforms' and the
+        'blocked_bot' column to 'users' if missing,
+      - add 'stock_items.content_hash' and its unique index, hashing existing rows,
+      - move cookie bodies out of 'stock_items' into blob_store,
+      - install the triggers that keep 'stock_count' in step with 'stock_items',
+      - move any legacy JSON stock from 'platforms.stock' into 'stock_items',
+      - install the dashboard counter triggers and fill 'stats' if it is empty.
     """
     conn = get_connection()
     c = conn.cursor()
+    c.execute("PRAGMA table_info(users)")
+    if 'blocked_bot' not in [col[1] for col in c.fetchall()]:
+        c.execute("ALTER TABLE users ADD COLUMN blocked_bot INTEGER DEFAULT 0")
+        conn.commit()
+    c.execute("PRAGMA table_info(stock_items)")
+    hash_added = 'content_hash' not in [col[1] for col in c.fetchall()]
+    if hash_added:
+        c.execute("ALTER TABLE stock_items ADD COLUMN content_hash BLOB")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_items_hash ON stock_items (platform_name, content_hash)")
+    conn.commit()
+    if hash_added:
+        _backfill_stock_hashes(conn)
     c.execute("PRAGMA table_info(platforms)")
     columns = [col[1] for col in c.fetchall()]
     if 'platform_type' not in columns:
         c.execute("ALTER TABLE platforms ADD COLUMN platform_type TEXT DEFAULT 'account'")
         conn.commit()
+    if 'stock_count' not in columns:
+        c.execute("ALTER TABLE platforms ADD COLUMN stock_count INTEGER DEFAULT 0")
+        c.execute("""
+            UPDATE platforms SET stock_count = (
+                SELECT COUNT(*) FROM stock_items
+                WHERE stock_items.platform_name = platforms.platform_name AND claimed = 0
+            )
+        """)
+        conn.commit()
+    c.executescript('''
+        CREATE TRIGGER IF NOT EXISTS stock_items_insert AFTER INSERT ON stock_items
+        WHEN NEW.claimed = 0
+        BEGIN
+            UPDATE platforms SET stock_count = stock_count + 1 WHERE platform_name = NEW.platform_name;
+        END;
+        CREATE TRIGGER IF NOT EXISTS stock_items_claim AFTER UPDATE OF claimed ON stock_items
+        WHEN OLD.claimed = 0 AND NEW.claimed != 0
+        BEGIN
+            UPDATE platforms SET stock_count = stock_count - 1 WHERE platform_name = NEW.platform_name;
+        END;
+        CREATE TRIGGER IF NOT EXISTS stock_items_release AFTER UPDATE OF claimed ON stock_items
+        WHEN OLD.claimed != 0 AND NEW.claimed = 0
+        BEGIN
+            UPDATE platforms SET stock_count = stock_count + 1 WHERE platform_name = NEW.platform_name;
+        END;
+        CREATE TRIGGER IF NOT EXISTS stock_items_delete AFTER DELETE ON stock_items
+        WHEN OLD.claimed = 0
+        BEGIN
+            UPDATE platforms SET stock_count = stock_count - 1 WHERE platform_name = OLD.platform_name;
+        END;
+    ''')
+    for index_sql in _INDEXES:
+        c.execute(index_sql)
+    conn.commit()
+    # Move legacy JSON stock into stock_items, one platform at a time.
+    c.execute("SELECT platform_name, stock FROM platforms WHERE stock IS NOT NULL AND stock NOT IN ('', '[]')")
+    for row in c.fetchall():
+        try:
+            items = json.loads(row["stock"])
+        except ValueError:
+            print(f"Skipping unreadable stock for platform '{row['platform_name']}'")
+            continue
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO stock_items (platform_name, item_type, content, content_hash) VALUES (?, ?, ?, ?)",
+                (_stock_item_row(row["platform_name"], item) for item in items)
+            )
+            conn.execute("UPDATE platforms SET stock = '[]' WHERE platform_name = ?", (row["platform_name"],))
+    _move_cookies_to_blobs(conn)
+    c.executescript(_STATS_TRIGGERS)
+    c.execute("SELECT COUNT(*) FROM stats")
+    empty = c.fetchone()[0] == 0
     c.close()
     conn.close()
+    if empty:
+        reconcile_stats()
 
 def add_verified_column():
     conn = get_connection()
@@ -150,23 +616,51 @@ def update_user_verified(telegram_id):
     conn.commit()
     c.close()
     conn.close()
+    _user_cache_update(telegram_id, verified=1)
 
-def set_config_value(key, value):
+# Process-wide cache of the configurations table. Reads are served from memory;
+# set_config_value writes through. With CONFIG_CACHE_TTL set (seconds) the cache
+# is also reloaded periodically so several processes sharing bot.db converge.
+CONFIG_CACHE_TTL = None
+_config_cache = None
+_config_loaded_at = 0.0
+_config_lock = threading.Lock()
+
+def _load_config_cache():
+    global _config_cache, _config_loaded_at
     conn = get_connection()
     c = conn.cursor()
-    c.execute("REPLACE INTO configurations (config_key, config_value) VALUES (?, ?)", (key, str(value)))
-    conn.commit()
+    c.execute("SELECT config_key, config_value FROM configurations")
+    cache = {row[0]: row[1] for row in c.fetchall()}
     c.close()
     conn.close()
+    _config_cache, _config_loaded_at = cache, time.monotonic()
+    return cache
 
-def get_config_value(key):
+def invalidate_config_cache():
+    global _config_cache
+    with _config_lock:
+        _config_cache = None
+
+def set_config_value(key, value):
+    global _config_cache
     conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT config_value FROM configurations WHERE config_key = ?", (key,))
-    row = c.fetchone()
+    c.execute("REPLACE INTO configurations (config_key, config_value) VALUES (?, ?)", (key, str(value)))
+    conn.commit()
     c.close()
     conn.close()
-    return row[0] if row else None
+    with _config_lock:
+        if _config_cache is not None:
+            # Swap in a new dict so readers never see a half-updated one.
+            _config_cache = {**_config_cache, key: str(value)}
+
+def get_config_value(key):
+    cache = _config_cache
+    if cache is None or (CONFIG_CACHE_TTL and time.monotonic() - _config_loaded_at > CONFIG_CACHE_TTL):
+        with _config_lock:
+            cache = _load_config_cache()
+    return cache.get(key)
 
 def set_account_claim_cost(cost):
     set_config_value("account_claim_cost", cost)
@@ -182,22 +676,95 @@ def get_referral_bonus():
     bonus = get_config_value("referral_bonus")
     return int(bonus) if bonus is not None else config.DEFAULT_REFERRAL_BONUS
 
-def add_user(telegram_id, username, join_date, pending_referrer=None):
+# LRU cache of user rows keyed by telegram_id, for get_user. Every function
+# here that writes a users column updates the cached row after its commit;
+# USER_CACHE_TTL bounds staleness from writes made outside this process.
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 300  # seconds
+_user_cache = OrderedDict()  # telegram_id -> (expires, User)
+_user_cache_lock = threading.Lock()
+_user_cache_writes = 0  # bumped on every write-through, see get_user
+_user_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def _user_cache_put(telegram_id, user, writes=None):
+    with _user_cache_lock:
+        if writes is not None and writes != _user_cache_writes:
+            # A write landed while the row was being read; it may be stale,
+            # and so may the entry already cached.
+            _user_cache.pop(telegram_id, None)
+            return
+        _user_cache[telegram_id] = (time.monotonic() + USER_CACHE_TTL, user)
+        _user_cache.move_to_end(telegram_id)
+        if len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+            _user_cache_stats["evictions"] += 1
+
+def _user_cache_update(telegram_id, **fields):
+    """
+    Write-through: apply committed column changes to the cached row, if any.
+    """
+    global _user_cache_writes
+    with _user_cache_lock:
+        _user_cache_writes += 1
+        entry = _user_cache.get(telegram_id)
+        if entry is not None:
+            _user_cache[telegram_id] = (entry[0], entry[1].replace(**fields))
+
+def invalidate_user_cache(telegram_id=None):
+    global _user_cache_writes
+    with _user_cache_lock:
+        _user_cache_writes += 1
+        if telegram_id is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(telegram_id, None)
+
+def user_cache_stats():
+    with _user_cache_lock:
+        return dict(_user_cache_stats, size=len(_user_cache))
+
+def upsert_user(telegram_id, username, join_date, pending_referrer=None):
+    """
+    Load a user's row, creating it if needed, in one transaction. Existing
+    users get their username refreshed and blocked_bot cleared (they are
+    talking to the bot again); pending_referrer only applies to new users.
+    """
+    with _user_cache_lock:
+        writes = _user_cache_writes
     conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,))
-    user = c.fetchone()
-    if not user:
-        c.execute("""
-            INSERT INTO users (telegram_id, username, join_date, pending_referrer)
-            VALUES (?, ?, ?, ?)
-        """, (telegram_id, username, join_date, pending_referrer))
-        conn.commit()
+    c.execute("""
+        INSERT INTO users (telegram_id, username, join_date, pending_referrer) VALUES (?, ?, ?, ?)
+        ON CONFLICT (telegram_id) DO NOTHING
+    """, (telegram_id, username, join_date, pending_referrer))
+    created = c.rowcount == 1
+    if created:
+        c.execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,))
+    else:
+        c.execute("UPDATE users SET username = ?, blocked_bot = 0 WHERE telegram_id = ? RETURNING *",
+                  (username, telegram_id))
+    user = User.from_row(c.fetchone())
+    conn.commit()
     c.close()
     conn.close()
-    return get_user(telegram_id)
+    _user_cache_put(telegram_id, user, writes)
+    if created:
+        # Let the cached leaderboard place the new user
+        _leaderboard_update(telegram_id, user["points"])
+    return user
 
 def get_user(telegram_id):
+    """
+    A user's row as a User record (shared with the LRU cache; do not modify), or None.
+    """
+    with _user_cache_lock:
+        entry = _user_cache.get(telegram_id)
+        if entry is not None and entry[0] > time.monotonic():
+            _user_cache.move_to_end(telegram_id)
+            _user_cache_stats["hits"] += 1
+            return entry[1]
+        _user_cache_stats["misses"] += 1
+        writes = _user_cache_writes
     conn = get_connection()
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
@@ -205,7 +772,11 @@ def get_user(telegram_id):
     user = c.fetchone()
     c.close()
     conn.close()
-    return dict(user) if user else None
+    if not user:
+        return None
+    user = User.from_row(user)
+    _user_cache_put(telegram_id, user, writes)
+    return user
 
 def update_user_points(telegram_id, new_points):
     conn = get_connection()
@@ -214,6 +785,27 @@ def update_user_points(telegram_id, new_points):
     conn.commit()
     c.close()
     conn.close()
+    _user_cache_update(telegram_id, points=new_points)
+    _leaderboard_update(telegram_id, new_points)
+
+def add_user_points(telegram_id, points):
+    """
+    Add points (negative to deduct) to a balance in SQL, so concurrent claims
+    and redemptions are not overwritten. Returns the new balance, or None if
+    the user does not exist.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("UPDATE users SET points = points + ? WHERE telegram_id = ? RETURNING points", (points, telegram_id))
+    row = c.fetchone()
+    conn.commit()
+    c.close()
+    conn.close()
+    if not row:
+        return None
+    _user_cache_update(telegram_id, points=row[0])
+    _leaderboard_update(telegram_id, row[0])
+    return row[0]
 
 def ban_user(telegram_id):
     conn = get_connection()
@@ -222,6 +814,7 @@ def ban_user(telegram_id):
     conn.commit()
     c.close()
     conn.close()
+    _user_cache_update(telegram_id, banned=1)
 
 def unban_user(telegram_id):
     conn = get_connection()
@@ -230,6 +823,7 @@ def unban_user(telegram_id):
     conn.commit()
     c.close()
     conn.close()
+    _user_cache_update(telegram_id, banned=0)
 
 def add_referral(referrer_id, referred_id):
     conn = get_connection()
@@ -239,8 +833,13 @@ def add_referral(referrer_id, referred_id):
         c.execute("INSERT INTO referrals (user_id, referred_id) VALUES (?, ?)", (referrer_id, referred_id))
         conn.commit()
         bonus = get_referral_bonus()
-        c.execute("UPDATE users SET points = points + ?, referrals = referrals + 1 WHERE telegram_id = ?", (bonus, referrer_id))
+        c.execute("UPDATE users SET points = points + ?, referrals = referrals + 1 WHERE telegram_id = ? "
+                  "RETURNING points, referrals", (bonus, referrer_id))
+        row = c.fetchone()
         conn.commit()
+        if row:
+            _user_cache_update(referrer_id, points=row[0], referrals=row[1])
+            _leaderboard_update(referrer_id, row[0])
     c.close()
     conn.close()
 
@@ -251,6 +850,7 @@ def clear_pending_referral(telegram_id):
     conn.commit()
     c.close()
     conn.close()
+    _user_cache_update(telegram_id, pending_referrer=None)
 
 def add_review(user_id, review_text):
     conn = get_connection()
@@ -276,7 +876,67 @@ def get_admins():
     admins = c.fetchall()
     c.close()
     conn.close()
-    return [dict(a) for a in admins]
+    return [Admin.from_row(a) for a in admins]
+
+# Owner/admin ids for role checks: config.OWNERS plus every non-banned row of
+# the admins table, held as a frozenset. Rebuilt lazily after any admin write.
+_admin_ids = None
+_admin_ids_lock = threading.Lock()
+
+def get_admin_ids():
+    global _admin_ids
+    ids = _admin_ids
+    if ids is None:
+        with _admin_ids_lock:
+            conn = get_connection()
+            c = conn.cursor()
+            c.execute("SELECT user_id FROM admins WHERE banned = 0")
+            ids = frozenset(config.OWNERS) | frozenset(str(row[0]) for row in c.fetchall())
+            c.close()
+            conn.close()
+            _admin_ids = ids
+    return ids
+
+def invalidate_admin_cache():
+    global _admin_ids
+    with _admin_ids_lock:
+        _admin_ids = None
+
+def get_admin(user_id):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT * FROM admins WHERE user_id = ?", (user_id,))
+    admin = c.fetchone()
+    c.close()
+    conn.close()
+    return Admin.from_row(admin) if admin else None
+
+def add_admin(user_id, username, role="admin"):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("REPLACE INTO admins (user_id, username, role, banned) VALUES (?, ?, ?, 0)", (user_id, username, role))
+    conn.commit()
+    c.close()
+    conn.close()
+    invalidate_admin_cache()
+
+def remove_admin(user_id):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
+    conn.commit()
+    c.close()
+    conn.close()
+    invalidate_admin_cache()
+
+def set_admin_banned(user_id, banned):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("UPDATE admins SET banned = ? WHERE user_id = ?", (1 if banned else 0, user_id))
+    conn.commit()
+    c.close()
+    conn.close()
+    invalidate_admin_cache()
 
 def get_key(key_str):
     conn = get_connection()
@@ -286,7 +946,7 @@ def get_key(key_str):
     key_doc = c.fetchone()
     c.close()
     conn.close()
-    return dict(key_doc) if key_doc else None
+    return Key.from_row(key_doc) if key_doc else None
 
 def claim_key_in_db(key_str, telegram_id):
     conn = get_connection()
@@ -306,10 +966,14 @@ def claim_key_in_db(key_str, telegram_id):
     c.execute("UPDATE keys SET claimed = 1, claimed_by = ?, timestamp = ? WHERE \"key\" = ?",
               (telegram_id, datetime.now(), key_str))
     conn.commit()
-    c.execute("UPDATE users SET points = points + ? WHERE telegram_id = ?", (points_awarded, telegram_id))
+    c.execute("UPDATE users SET points = points + ? WHERE telegram_id = ? RETURNING points", (points_awarded, telegram_id))
+    row = c.fetchone()
     conn.commit()
     c.close()
     conn.close()
+    if row:
+        _user_cache_update(telegram_id, points=row[0])
+        _leaderboard_update(telegram_id, row[0])
     return f"Key redeemed successfully. You've been awarded {points_awarded} points."
 
 def add_key(key_str, key_type, points):
@@ -321,6 +985,19 @@ def add_key(key_str, key_type, points):
     c.close()
     conn.close()
 
+def add_keys(key_strs, key_type, points):
+    """
+    Insert many keys in one transaction. Raises sqlite3.IntegrityError (and
+    inserts nothing) if any key already exists.
+    """
+    now = datetime.now()
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO keys (\"key\", type, points, claimed, claimed_by, timestamp) VALUES (?, ?, ?, 0, NULL, ?)",
+            ((key_str, key_type, points, now) for key_str in key_strs)
+        )
+
 def get_keys():
     conn = get_connection()
     conn.row_factory = sqlite3.Row
@@ -329,58 +1006,441 @@ def get_keys():
     keys = c.fetchall()
     c.close()
     conn.close()
-    return [dict(k) for k in keys]
+    return [Key.from_row(k) for k in keys]
+
+# Cached top of the leaderboard, kept current by every write that changes a
+# balance (_leaderboard_update). Reloaded from idx_users_points only when a
+# cached user drops out and the replacement is unknown.
+LEADERBOARD_CACHE_SIZE = 50
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+
+def _load_leaderboard():
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT telegram_id, username, points FROM users ORDER BY points DESC LIMIT ?",
+              (LEADERBOARD_CACHE_SIZE,))
+    leaderboard = [User.from_row(row) for row in c.fetchall()]
+    c.close()
+    conn.close()
+    return leaderboard
+
+def _leaderboard_update(telegram_id, points):
+    global _leaderboard
+    with _leaderboard_lock:
+        if _leaderboard is None:
+            return
+        board = list(_leaderboard)
+        index = next((i for i, e in enumerate(board) if e.telegram_id == telegram_id), None)
+        full = len(board) >= LEADERBOARD_CACHE_SIZE
+        tail = board[-1].points if board else None
+        if index is not None:
+            if full and points < tail:
+                # Someone outside the cache may now rank higher; reload on next read.
+                _leaderboard = None
+                return
+            board[index] = board[index].replace(points=points)
+        elif not full or points > tail:
+            user = get_user(telegram_id)
+            if not user:
+                return
+            board.append(User(telegram_id=telegram_id, username=user.username, points=points))
+        else:
+            return
+        board.sort(key=lambda e: e.points, reverse=True)
+        _leaderboard = board[:LEADERBOARD_CACHE_SIZE]
+
+def invalidate_leaderboard():
+    global _leaderboard
+    with _leaderboard_lock:
+        _leaderboard = None
 
 def get_leaderboard(limit=10):
+    """
+    The top `limit` users, at most LEADERBOARD_CACHE_SIZE, from the cache.
+    """
+    global _leaderboard
+    board = _leaderboard
+    if board is None:
+        with _leaderboard_lock:
+            board = _leaderboard
+            if board is None:
+                board = _leaderboard = _load_leaderboard()
+    return board[:limit]
+
+def get_user_rank(telegram_id):
+    """
+    1-based leaderboard position of a user (ties share a rank), or None if unknown.
+    Counted on idx_users_points, so no sort of the users table is needed.
+    """
     conn = get_connection()
-    conn.row_factory = sqlite3.Row
     c = conn.cursor()
-    c.execute("SELECT telegram_id, username, points FROM users ORDER BY points DESC LIMIT ?", (limit,))
-    leaderboard = c.fetchall()
+    c.execute("SELECT points FROM users WHERE telegram_id = ?", (telegram_id,))
+    row = c.fetchone()
+    if not row:
+        c.close()
+        conn.close()
+        return None
+    c.execute("SELECT COUNT(*) FROM users WHERE points > ?", (row[0],))
+    rank = c.fetchone()[0] + 1
     c.close()
     conn.close()
-    return [dict(row) for row in leaderboard]
+    return rank
 
-def get_admin_dashboard():
+def get_users_page(after_id=None, before_id=None, limit=10):
+    """
+    One page of users ordered by telegram_id, using keyset pagination.
+    Pass after_id for the page following that id, before_id for the page
+    preceding it, or neither for the first page. Fetches limit + 1 rows so
+    the caller can tell whether another page exists in that direction.
+    Returns (rows, has_more).
+    """
     conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM users")
-    total_users = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM users WHERE banned = 1")
-    banned_users = c.fetchone()[0]
-    c.execute("SELECT SUM(points) FROM users")
-    total_points = c.fetchone()[0] or 0
+    if before_id is not None:
+        c.execute("SELECT telegram_id, username, banned FROM users WHERE telegram_id < ? "
+                  "ORDER BY telegram_id DESC LIMIT ?", (before_id, limit + 1))
+        rows = [User.from_row(r) for r in c.fetchall()]
+        has_more = len(rows) > limit
+        rows = rows[:limit][::-1]
+    else:
+        c.execute("SELECT telegram_id, username, banned FROM users WHERE telegram_id > ? "
+                  "ORDER BY telegram_id LIMIT ?", (after_id or "", limit + 1))
+        rows = [User.from_row(r) for r in c.fetchall()]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
     c.close()
     conn.close()
-    return total_users, banned_users, total_points
+    return rows, has_more
 
-def get_platforms():
+def search_users(query, limit=10):
+    """
+    Find users by exact telegram_id or by username prefix (case-insensitive).
+    Both lookups are index range scans.
+    """
+    query = query.strip().lstrip("@")
+    if not query:
+        return []
     conn = get_connection()
-    conn.row_factory = sqlite3.Row
     c = conn.cursor()
-    c.execute("SELECT * FROM platforms")
-    platforms = c.fetchall()
+    results = []
+    if query.isdigit():
+        c.execute("SELECT telegram_id, username, banned FROM users WHERE telegram_id = ?", (query,))
+        results.extend(User.from_row(r) for r in c.fetchall())
+    c.execute("SELECT telegram_id, username, banned FROM users WHERE username >= ? COLLATE NOCASE "
+              "AND username < ? COLLATE NOCASE ORDER BY username COLLATE NOCASE LIMIT ?",
+              (query, query + "\uffff", limit))
+    seen = {r["telegram_id"] for r in results}
+    results.extend(User.from_row(r) for r in c.fetchall() if r["telegram_id"] not in seen)
     c.close()
     conn.close()
-    return [dict(p) for p in platforms]
+    return results[:limit]
 
-def update_stock_for_platform(platform_name, stock):
+def get_admin_dashboard():
+    """
+    Dashboard metrics read from the trigger-maintained stats table, plus
+    per-platform stock from platforms.stock_count.
+    """
     conn = get_connection()
     c = conn.cursor()
-    c.execute("UPDATE platforms SET stock = ? WHERE platform_name = ?", (json.dumps(stock), platform_name))
-    conn.commit()
+    c.execute("SELECT name, value FROM stats")
+    dashboard = {name: 0 for name in STAT_NAMES}
+    dashboard.update({row[0]: row[1] for row in c.fetchall()})
+    c.execute("SELECT platform_name, stock_count FROM platforms ORDER BY platform_name")
+    dashboard["platform_stock"] = {row[0]: row[1] or 0 for row in c.fetchall()}
+    dashboard["total_stock"] = sum(dashboard["platform_stock"].values())
     c.close()
     conn.close()
-    log_event(telebot.TeleBot(config.TOKEN), "stock", f"Platform '{platform_name}' stock updated to {len(stock)} items.")
+    return dashboard
 
-def rename_platform(old_name, new_name):
+# Platform catalog (name, type, price and stock count; never item payloads),
+# cached in memory. Structural changes, uploads and refunds invalidate it;
+# claims write the new stock count into the cached entry. Each change bumps the
+# version so derived data (like the rewards keyboard) knows to rebuild.
+PLATFORM_CATALOG_TTL = None  # seconds; set when several processes share bot.db
+_platform_catalog = None
+_platform_catalog_loaded_at = 0.0
+_platform_catalog_version = 0
+_platform_catalog_lock = threading.Lock()
+
+def _load_platform_catalog():
     conn = get_connection()
     c = conn.cursor()
-    c.execute("UPDATE platforms SET platform_name = ? WHERE platform_name = ?", (new_name, old_name))
-    conn.commit()
+    c.execute("SELECT platform_name, price, platform_type, stock_count FROM platforms ORDER BY rowid")
+    platforms = [Platform.from_row(p) for p in c.fetchall()]
     c.close()
     conn.close()
-    log_event(telebot.TeleBot(config.TOKEN), "platform", f"Platform renamed from '{old_name}' to '{new_name}'.")
+    return platforms
+
+def get_platform_catalog():
+    """
+    Return (version, platforms). The list and its Platform records are shared; do not modify them.
+    """
+    global _platform_catalog, _platform_catalog_loaded_at, _platform_catalog_version
+    catalog = _platform_catalog
+    if catalog is None or (PLATFORM_CATALOG_TTL and
+                           time.monotonic() - _platform_catalog_loaded_at > PLATFORM_CATALOG_TTL):
+        with _platform_catalog_lock:
+            platforms = _load_platform_catalog()
+            # A reload may pick up changes made by another process
+            _platform_catalog_version += 1
+            catalog = _platform_catalog = (_platform_catalog_version, platforms)
+            _platform_catalog_loaded_at = time.monotonic()
+    return catalog
+
+def invalidate_platform_catalog():
+    global _platform_catalog, _platform_catalog_version
+    with _platform_catalog_lock:
+        _platform_catalog = None
+        _platform_catalog_version += 1
+
+def _platform_catalog_set_stock(platform_name, stock_count):
+    global _platform_catalog, _platform_catalog_version
+    with _platform_catalog_lock:
+        if _platform_catalog is None:
+            return
+        _platform_catalog_version += 1
+        platforms = [
+            p.replace(stock_count=stock_count) if p.platform_name == platform_name else p
+            for p in _platform_catalog[1]
+        ]
+        _platform_catalog = (_platform_catalog_version, platforms)
+
+def get_platforms():
+    return list(get_platform_catalog()[1])
+
+def get_platform(platform_name):
+    for platform in get_platform_catalog()[1]:
+        if platform.platform_name == platform_name:
+            return platform
+    return None
+
+def normalize_stock_content(item_type, content):
+    """
+    Canonical form used for storage and duplicate detection: surrounding
+    whitespace removed and, for cookie files, line endings unified.
+    """
+    content = str(content)
+    if item_type == "cookie":
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content.strip()
+
+def stock_content_hash(content):
+    return hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).digest()
+
+def _stock_item_row(platform_name, item):
+    """
+    Map a stock item in the legacy format (a plain account string, or a
+    {"type": "cookie", "content": ...} dict) to a stock_items row:
+    (platform_name, item_type, content, content_hash).
+    Cookie bodies are written to blob_store here and the row keeps only the hash.
+    """
+    if isinstance(item, dict):
+        item_type = item.get("type", "account")
+        content = normalize_stock_content(item_type, item.get("content", ""))
+    else:
+        item_type = "account"
+        content = normalize_stock_content(item_type, item)
+    content_hash = stock_content_hash(content)
+    if item_type == "cookie":
+        blob_store.put(content_hash, content)
+        content = None
+    return platform_name, item_type, content, content_hash
+
+def get_stock_count(platform_name):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT stock_count FROM platforms WHERE platform_name = ?", (platform_name,))
+    row = c.fetchone()
+    c.close()
+    conn.close()
+    return row[0] if row else 0
+
+STOCK_INGEST_CHUNK = 5000  # items per insert transaction
+
+def _find_stock_hashes(conn, platform_name, hashes, batch_size=500):
+    """
+    Map each of the given content hashes already stored for the platform to its row id.
+    """
+    found = {}
+    hashes = list(hashes)
+    for start in range(0, len(hashes), batch_size):
+        batch = hashes[start:start + batch_size]
+        placeholders = ", ".join("?" * len(batch))
+        for row in conn.execute(f"SELECT content_hash, id FROM stock_items "
+                                f"WHERE platform_name = ? AND content_hash IN ({placeholders})",
+                                [platform_name] + batch):
+            found[row[0]] = row[1]
+    return found
+
+def ingest_stock_items(platform_name, items, upload_id=None, chunk_size=STOCK_INGEST_CHUNK, progress=None):
+    """
+    Append items (any iterable, consumed lazily) to a platform's stock in
+    chunked executemany transactions, so memory stays bounded by one chunk.
+
+    Items are deduplicated on the SHA-256 of their normalized content against
+    everything the platform has ever stocked (claimed or not), through the
+    unique (platform_name, content_hash) index. Duplicates are counted as
+    in-file when the matching row was added by this same ingest and as in-db
+    otherwise.
+
+    With an upload_id (e.g. the Telegram file_unique_id) the number of items
+    consumed is recorded in stock_uploads in the same transaction as each
+    chunk. Re-running the same upload skips what was already committed, and
+    a finished upload is not imported twice.
+    progress, if given, is called with the number of items handled so far.
+    Returns a dict: added, duplicates_in_file, duplicates_in_db, skipped
+    (items consumed by an earlier attempt), already_done and total (stock
+    count afterwards).
+    """
+    conn = get_connection()
+    result = {"added": 0, "duplicates_in_file": 0, "duplicates_in_db": 0, "skipped": 0,
+              "already_done": False, "total": 0}
+    if upload_id is not None:
+        c = conn.cursor()
+        c.execute("SELECT items_done, status FROM stock_uploads WHERE upload_id = ?", (upload_id,))
+        row = c.fetchone()
+        c.close()
+        if row and row["status"] == "done":
+            result.update(skipped=row["items_done"], already_done=True, total=get_stock_count(platform_name))
+            return result
+        result["skipped"] = row["items_done"] if row else 0
+    items = iter(items)
+    if result["skipped"]:
+        for _ in itertools.islice(items, result["skipped"]):
+            pass
+    # Rows with a higher id than this were inserted by this ingest.
+    start_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM stock_items").fetchone()[0]
+    consumed = 0
+    while True:
+        rows = [_stock_item_row(platform_name, item) for item in itertools.islice(items, chunk_size)]
+        if not rows:
+            break
+        consumed += len(rows)
+        with conn:
+            existing = _find_stock_hashes(conn, platform_name, {row[3] for row in rows})
+            fresh = {}
+            for row in rows:
+                content_hash = row[3]
+                if content_hash in fresh:
+                    result["duplicates_in_file"] += 1
+                elif content_hash in existing:
+                    if existing[content_hash] > start_id:
+                        result["duplicates_in_file"] += 1
+                    else:
+                        result["duplicates_in_db"] += 1
+                else:
+                    fresh[content_hash] = row
+            c = conn.executemany(
+                "INSERT OR IGNORE INTO stock_items (platform_name, item_type, content, content_hash) VALUES (?, ?, ?, ?)",
+                fresh.values()
+            )
+            # A concurrent ingest may have stored some of these in the meantime
+            result["added"] += c.rowcount
+            result["duplicates_in_db"] += len(fresh) - c.rowcount
+            if upload_id is not None:
+                conn.execute("""
+                    INSERT INTO stock_uploads (upload_id, platform_name, items_done, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (upload_id) DO UPDATE SET items_done = items_done + excluded.items_done,
+                                                          updated_at = excluded.updated_at
+                """, (upload_id, platform_name, len(rows), datetime.now()))
+        if progress:
+            progress(result["skipped"] + consumed)
+    if upload_id is not None:
+        with conn:
+            conn.execute("""
+                INSERT INTO stock_uploads (upload_id, platform_name, status, updated_at) VALUES (?, ?, 'done', ?)
+                ON CONFLICT (upload_id) DO UPDATE SET status = 'done', updated_at = excluded.updated_at
+            """, (upload_id, platform_name, datetime.now()))
+    invalidate_platform_catalog()
+    result["total"] = get_stock_count(platform_name)
+    log_event(get_bot(), "stock", f"Platform '{platform_name}' stock updated to {result['total']} items "
+                                  f"(+{result['added']}, {result['duplicates_in_file'] + result['duplicates_in_db']} duplicates skipped).")
+    return result
+
+def claim_stock_item(platform_name, telegram_id):
+    """
+    Atomically charge the user and reserve one unclaimed item of the platform.
+    Balance check, points deduction and reservation run in one BEGIN IMMEDIATE
+    transaction, so concurrent claims can neither hand out the same item nor lose
+    a deduction. Returns a dict with:
+      status: 'ok', 'no_user', 'no_platform', 'insufficient' or 'out_of_stock'
+      item (a StockItem), item_id, price, points (new balance) when status is 'ok';
+      price otherwise.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        c.execute("SELECT price FROM platforms WHERE platform_name = ?", (platform_name,))
+        platform = c.fetchone()
+        if not platform:
+            conn.rollback()
+            return {"status": "no_platform"}
+        price = platform["price"] or get_account_claim_cost()
+        c.execute("UPDATE users SET points = points - ? WHERE telegram_id = ? AND points >= ?",
+                  (price, telegram_id, price))
+        if c.rowcount == 0:
+            c.execute("SELECT 1 FROM users WHERE telegram_id = ?", (telegram_id,))
+            status = "insufficient" if c.fetchone() else "no_user"
+            conn.rollback()
+            return {"status": status, "price": price}
+        c.execute("""
+            SELECT id, platform_name, item_type, content, content_hash FROM stock_items
+            WHERE platform_name = ? AND claimed = 0 ORDER BY id LIMIT 1
+        """, (platform_name,))
+        row = c.fetchone()
+        if not row:
+            conn.rollback()
+            return {"status": "out_of_stock", "price": price}
+        c.execute("UPDATE stock_items SET claimed = 1, claimed_by = ?, claimed_at = ? WHERE id = ? AND claimed = 0",
+                  (telegram_id, datetime.now(), row["id"]))
+        c.execute("SELECT points FROM users WHERE telegram_id = ?", (telegram_id,))
+        points = c.fetchone()["points"]
+        c.execute("SELECT stock_count FROM platforms WHERE platform_name = ?", (platform_name,))
+        stock_count = c.fetchone()["stock_count"]
+        conn.commit()
+        _user_cache_update(telegram_id, points=points)
+        _leaderboard_update(telegram_id, points)
+        _platform_catalog_set_stock(platform_name, stock_count)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        c.close()
+    return {"status": "ok", "item": StockItem.from_row(row), "item_id": row["id"], "price": price, "points": points}
+
+# claimed value of items set aside by release_stock_item: out of stock, but
+# kept (with their hash) for the claim history and upload deduplication.
+STOCK_UNDELIVERABLE = 2
+
+def release_stock_item(item_id, telegram_id, price):
+    """
+    Undo the charge of claim_stock_item when the item could not be delivered:
+    refund the user and set the item aside as undeliverable, in one
+    transaction. Putting it back would hand the same item (the lowest id) to
+    every following claim.
+    """
+    conn = get_connection()
+    with conn:
+        c = conn.execute("UPDATE stock_items SET claimed = ?, claimed_by = NULL, claimed_at = ? "
+                         "WHERE id = ? AND claimed = 1 AND claimed_by = ?",
+                         (STOCK_UNDELIVERABLE, datetime.now(), item_id, telegram_id))
+        row = None
+        if c.rowcount:
+            row = conn.execute("UPDATE users SET points = points + ? WHERE telegram_id = ? RETURNING points",
+                               (price, telegram_id)).fetchone()
+    if row:
+        _user_cache_update(telegram_id, points=row[0])
+        _leaderboard_update(telegram_id, row[0])
+
+def rename_platform(old_name, new_name):
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE platforms SET platform_name = ? WHERE platform_name = ?", (new_name, old_name))
+        conn.execute("UPDATE stock_items SET platform_name = ? WHERE platform_name = ?", (new_name, old_name))
+    invalidate_platform_catalog()
+    log_event(get_bot(), "platform", f"Platform renamed from '{old_name}' to '{new_name}'.")
 
 # In db.py
 
@@ -394,7 +1454,7 @@ def update_platform_price(platform_name, new_price):
     conn.commit()
     c.close()
     conn.close()
-    
+    invalidate_platform_catalog()
 
 def check_if_report_claimed(user_id):
     conn = get_connection()
@@ -437,4 +1497,73 @@ def close_report_in_db(user_id, admin_id):
     conn.commit()
     c.close()
     conn.close()
-        
+
+def mark_user_blocked(telegram_id, blocked=True):
+    """
+    Flag a user who blocked the bot (or deleted their account) so broadcasts skip them.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("UPDATE users SET blocked_bot = ? WHERE telegram_id = ?", (1 if blocked else 0, telegram_id))
+    conn.commit()
+    c.close()
+    conn.close()
+    _user_cache_update(telegram_id, blocked_bot=1 if blocked else 0)
+
+def get_broadcast_recipients(after_user_id, limit):
+    """
+    Next page of broadcast recipients after the given telegram_id (keyset pagination).
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT telegram_id FROM users WHERE telegram_id > ? AND blocked_bot = 0 ORDER BY telegram_id LIMIT ?",
+              (after_user_id, limit))
+    rows = c.fetchall()
+    c.close()
+    conn.close()
+    return [row[0] for row in rows]
+
+def create_broadcast_job(admin_id, chat_id, text):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("INSERT INTO broadcast_jobs (admin_id, chat_id, text) VALUES (?, ?, ?)", (admin_id, chat_id, text))
+    job_id = c.lastrowid
+    conn.commit()
+    c.close()
+    conn.close()
+    return job_id
+
+def get_broadcast_job(job_id):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,))
+    job = c.fetchone()
+    c.close()
+    conn.close()
+    return dict(job) if job else None
+
+def get_running_broadcast_jobs():
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT id FROM broadcast_jobs WHERE status = 'running' ORDER BY id")
+    rows = c.fetchall()
+    c.close()
+    conn.close()
+    return [row[0] for row in rows]
+
+def update_broadcast_job(job_id, **fields):
+    """
+    Save progress for a broadcast job (last_user_id, counters, status, progress_message_id).
+    """
+    allowed = ("status", "last_user_id", "delivered", "blocked", "failed", "progress_message_id")
+    columns = [name for name in fields if name in allowed]
+    if not columns:
+        return
+    assignments = ", ".join(f"{name} = ?" for name in columns)
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(f"UPDATE broadcast_jobs SET {assignments}, updated_at = ? WHERE id = ?",
+              [fields[name] for name in columns] + [datetime.now(), job_id])
+    conn.commit()
+    c.close()
+    conn.close()
@@ -0,0 +1,155 @@
+"""
+Per-user update lanes. Every update is routed by its sender's id to one of
+DISPATCH_LANES worker threads, so handlers run concurrently across users
+while each user's updates (and next-step flows) stay in order.
+"""
+import os
+import queue
+import threading
+import telebot
+from throttle import Throttle, THROTTLE_CALLBACK_TEXT
+
+DISPATCH_LANES = min(32, (os.cpu_count() or 1) * 4)
+DISPATCH_LANE_QUEUE = 50       # pending updates per lane before shedding load
+BUSY_TEXT = "⏳ The bot is busy right now, please try again in a moment."
+
+_UPDATE_FIELDS = ("message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+                  "my_chat_member", "chat_member", "chat_join_request", "shipping_query", "pre_checkout_query")
+
+
+def update_sender(update):
+    """
+    The Telegram user an update comes from, or None (e.g. channel posts).
+    """
+    for field in _UPDATE_FIELDS:
+        obj = getattr(update, field, None)
+        if obj is not None:
+            return getattr(obj, "from_user", None)
+    return None
+
+
+class LaneDispatcher:
+    """
+    Fixed set of lanes, each a bounded queue with one worker thread.
+    """
+
+    def __init__(self, handle, lanes=DISPATCH_LANES, queue_size=DISPATCH_LANE_QUEUE):
+        self.handle = handle
+        self.lanes = [queue.Queue(maxsize=queue_size) for _ in range(lanes)]
+        self.counters = {"dispatched": 0, "shed": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i, lane in enumerate(self.lanes):
+                thread = threading.Thread(target=self._work, args=(lane,), name=f"lane-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self, lane):
+        # Imported here: db imports bot_client, which imports this module
+        from db import rollback_open_transaction
+        while True:
+            update = lane.get()
+            if update is None:
+                return
+            try:
+                self.handle(update)
+            except Exception as e:
+                self._count("failed")
+                print(f"Error handling update {getattr(update, 'update_id', '?')}: {e}")
+            finally:
+                # A handler that failed mid-write must not keep this lane's connection locked
+                rollback_open_transaction()
+
+    def submit(self, update):
+        """
+        Queue an update on its sender's lane. Returns False if that lane is full.
+        """
+        self.start()
+        user = update_sender(update)
+        key = user.id if user is not None else update.update_id
+        try:
+            self.lanes[hash(key) % len(self.lanes)].put_nowait(update)
+        except queue.Full:
+            self._count("shed")
+            return False
+        self._count("dispatched")
+        return True
+
+    def stop(self, timeout=30):
+        """
+        Let every lane finish what it has queued, then stop the workers.
+        """
+        for lane in self.lanes:
+            lane.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters["queued"] = sum(lane.qsize() for lane in self.lanes)
+        return counters
+
+
+class LaneBot(telebot.TeleBot):
+    """
+    TeleBot whose process_new_updates hands each update to a LaneDispatcher
+    instead of running handlers on the caller's thread (or telebot's own,
+    unordered, thread pool). Create it with threaded=False.
+    Updates over the sender's flood limits (see throttle.py) are dropped
+    first; throttled button presses get a short callback answer. Commands of
+    registered message handlers get their own throttle keys.
+    """
+
+    def __init__(self, *args, lanes=DISPATCH_LANES, queue_size=DISPATCH_LANE_QUEUE, throttle=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dispatcher = LaneDispatcher(self._handle_update, lanes, queue_size)
+        self.throttle = throttle if throttle is not None else Throttle()
+
+    def add_message_handler(self, handler_dict):
+        super().add_message_handler(handler_dict)
+        for command in handler_dict["filters"].get("commands") or ():
+            self.throttle.register_command(command)
+
+    def _handle_update(self, update):
+        super().process_new_updates([update])
+
+    def process_new_updates(self, updates):
+        # Advance the polling offset now; the lanes process the updates later.
+        for update in updates:
+            if update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+        for update in updates:
+            user = update_sender(update)
+            if user is not None and not self.throttle.allow_update(update, user):
+                self._reply_throttled(update)
+                continue
+            if not self.dispatcher.submit(update):
+                self._reply_busy(update)
+
+    def _reply_throttled(self, update):
+        # Messages are dropped silently; callbacks are answered so the button stops spinning
+        if getattr(update, "callback_query", None) is None:
+            return
+        try:
+            self.answer_callback_query(update.callback_query.id, THROTTLE_CALLBACK_TEXT)
+        except Exception as e:
+            print(f"Error answering throttled callback: {e}")
+
+    def _reply_busy(self, update):
+        try:
+            if getattr(update, "callback_query", None) is not None:
+                self.answer_callback_query(update.callback_query.id, BUSY_TEXT)
+            elif getattr(update, "message", None) is not None:
+                self.send_message(update.message.chat.id, BUSY_TEXT)
+        except Exception as e:
+            print(f"Error sending busy reply: {e}")
@@ -1,7 +1,6 @@
 # account_info.py
 import telebot
-from db import get_user, add_user
-from datetime import datetime
+from handlers.context import user_context
 
 def send_account_info(bot, update):
     """
@@ -15,19 +14,15 @@ def send_account_info(bot, update):
     """
     if isinstance(update, telebot.types.CallbackQuery):
         chat_id = update.message.chat.id
-        user_obj = update.from_user
     elif isinstance(update, telebot.types.Message):
         chat_id = update.chat.id
-        user_obj = update.from_user
     else:
         return
 
-    telegram_id = str(user_obj.id)
-    user = get_user(telegram_id)
-    if not user:
-        new_username = user_obj.username or user_obj.first_name
-        add_user(telegram_id, new_username, datetime.now().strftime("%Y-%m-%d"))
-        user = get_user(telegram_id)
+    # Loaded (or created) once for this update by the context middleware. For
+    # call.message the sender is the bot, so take the id from the row too.
+    user = user_context(update)["user"]
+    telegram_id = user.get("telegram_id")
 
     username = user.get("username", "N/A")
     join_date = user.get("join_date", "N/A")
@@ -1,45 +1,57 @@
 import sqlite3
-import json
+import secrets
+import string
 import config
 from datetime import datetime
 from telebot import types
-import telebot
 from db import (
     get_user,
+    get_users_page,
+    search_users,
     ban_user,
     unban_user,
-    update_user_points,
+    add_user_points,
     get_account_claim_cost,
     get_admins,
+    get_admin,
+    get_admin_ids,
+    get_admin_dashboard,
+    user_cache_stats,
+    add_admin,
+    remove_admin,
+    set_admin_banned,
     get_platforms,
+    get_platform,
+    invalidate_platform_catalog,
     rename_platform,
     update_platform_price,
 )
 from handlers.logs import log_event
+from handlers.stock_ingest import (ingest_account_upload, ingest_cookie_upload, start_import, UploadTooLarge,
+                                   COOKIE_ERRORS_SHOWN)
+from bot_client import get_bot
+from records import User
 
 
 def is_admin(user_or_id):
     try:
-        if isinstance(user_or_id, dict):
+        if isinstance(user_or_id, (dict, User)):
             user_id = str(user_or_id.get("telegram_id"))
         else:
             user_id = str(user_or_id.id)
     except AttributeError:
         user_id = str(user_or_id)
-    db_admins = get_admins()
-    db_admin_ids = [admin.get("user_id") for admin in db_admins]
-    return user_id in config.OWNERS or user_id in db_admin_ids
+    # Owners and non-banned admins, cached as a frozenset (no DB access once warm)
+    return user_id in get_admin_ids()
 
 # ----------------- LEND POINTS -----------------
 
 def lend_points(admin_id, user_id, points, custom_message=None):
-    user = get_user(user_id)
-    if not user:
+    new_balance = add_user_points(user_id, points)
+    if new_balance is None:
         return f"User '{user_id}' not found."
-    new_balance = user["points"] + points
-    update_user_points(user_id, new_balance)
-    log_event(telebot.TeleBot(config.TOKEN), "lend", f"Admin {admin_id} lent {points} points to user {user_id}.")
-    bot_instance = telebot.TeleBot(config.TOKEN)
+    log_event(get_bot(), "lend", f"Admin {admin_id} lent {points} points to user {user_id}.")
+    bot_instance = get_bot()
     msg = f"You have been lent {points} points. New balance: {new_balance} points."
     if custom_message:
         msg += "\nMessage: " + custom_message
@@ -55,27 +67,62 @@ def lend_points(admin_id, user_id, points, custom_message=None):
 def update_account_claim_cost(cost):
     from db import set_config_value
     set_config_value("account_claim_cost", cost)
-    log_event(telebot.TeleBot(config.TOKEN), "config", f"Account claim cost updated to {cost} pts.")
+    log_event(get_bot(), "config", f"Account claim cost updated to {cost} pts.")
 
 def update_referral_bonus(bonus):
     from db import set_config_value
     set_config_value("referral_bonus", bonus)
-    log_event(telebot.TeleBot(config.TOKEN), "config", f"Referral bonus updated to {bonus} pts.")
+    log_event(get_bot(), "config", f"Referral bonus updated to {bonus} pts.")
 
 # ----------------- KEY GENERATION AND ADDITION -----------------
 
+KEY_ALPHABET = string.ascii_uppercase + string.digits
+KEY_PREFIXES = {"normal": "NKEY-", "premium": "PKEY-"}
+MAX_KEYS_PER_GEN = 100000
+
+def _random_key(prefix, length=10):
+    # One CSPRNG draw per key, written out in base 36.
+    n = secrets.randbelow(len(KEY_ALPHABET) ** length)
+    chars = []
+    for _ in range(length):
+        n, r = divmod(n, len(KEY_ALPHABET))
+        chars.append(KEY_ALPHABET[r])
+    return prefix + ''.join(chars)
+
 def generate_normal_key():
-    import random, string
-    return "NKEY-" + ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+    return _random_key(KEY_PREFIXES["normal"])
 
 def generate_premium_key():
-    import random, string
-    return "PKEY-" + ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+    return _random_key(KEY_PREFIXES["premium"])
 
 def add_key(key_str, key_type, points):
     from db import add_key as db_add_key  # Assumes your db.py contains an add_key() function.
     db_add_key(key_str, key_type, points)
-    log_event(telebot.TeleBot(config.TOKEN), "key", f"Key {key_str} ({key_type}) added with {points} pts.")
+    log_event(get_bot(), "key", f"Key {key_str} ({key_type}) added with {points} pts.")
+
+def generate_keys(key_type, qty, points, admin_id=None, retries=3):
+    """
+    Mint qty unique keys of the given type and store them with a single executemany.
+    Keys come from the secrets CSPRNG and are deduplicated in memory; if a batch
+    collides with a key already in the database it is regenerated.
+    Returns the list of keys.
+    """
+    from db import add_keys
+    prefix = KEY_PREFIXES[key_type]
+    for attempt in range(retries):
+        keys = set()
+        while len(keys) < qty:
+            keys.add(_random_key(prefix))
+        keys = list(keys)
+        try:
+            add_keys(keys, key_type, points)
+            break
+        except sqlite3.IntegrityError:
+            if attempt == retries - 1:
+                raise
+    log_event(get_bot(), "key",
+              f"{qty} {key_type} key(s) worth {points} pts generated" + (f" by admin {admin_id}." if admin_id else "."))
+    return keys
 
 # ----------------- PLATFORM MANAGEMENT -----------------
 
@@ -97,7 +144,8 @@ def add_platform(platform_name, price, platform_type="account"):
     conn.commit()
     c.close()
     conn.close()
-    log_event(telebot.TeleBot(config.TOKEN), "platform", 
+    invalidate_platform_catalog()
+    log_event(get_bot(), "platform", 
               f"Platform '{platform_name}' added with price {price} pts. Type: {platform_type}.")
     return None
 
@@ -105,10 +153,14 @@ def remove_platform(platform_name):
     conn = __import__('db').get_connection()
     c = conn.cursor()
     c.execute("DELETE FROM platforms WHERE platform_name = ?", (platform_name,))
+    # Unclaimed stock only: claimed rows are the claim history, and their hashes
+    # keep deduplicating uploads if the platform is added again.
+    c.execute("DELETE FROM stock_items WHERE platform_name = ? AND claimed = 0", (platform_name,))
     conn.commit()
     c.close()
     conn.close()
-    log_event(telebot.TeleBot(config.TOKEN), "platform", f"Platform '{platform_name}' removed.")
+    invalidate_platform_catalog()
+    log_event(get_bot(), "platform", f"Platform '{platform_name}' removed.")
 
 def handle_admin_platform(bot, call):
     markup = types.InlineKeyboardMarkup(row_width=2)
@@ -237,10 +289,10 @@ def handle_admin_platform_list(bot, call):
     text = "Platforms:\n"
     for plat in platforms:
         plat_name = plat.get("platform_name")
-        stock = json.loads(plat.get("stock") or "[]")
+        stock_count = plat.get("stock_count") or 0
         price = plat.get("price")
         p_type = plat.get("platform_type", "account")
-        text += f"• {plat_name} | Type: {p_type} | Stock: {len(stock)} | Price: {price} pts\n"
+        text += f"• {plat_name} | Type: {p_type} | Stock: {stock_count} | Price: {price} pts\n"
     text += "\n🔙 /back to return."
     bot.edit_message_text(text, chat_id=call.message.chat.id, message_id=call.message.message_id)
 
@@ -262,25 +314,18 @@ def handle_admin_stock(bot, call):
                           reply_markup=markup)
 
 def handle_admin_stock_detail(bot, call, platform_name):
-    conn = __import__('db').get_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM platforms WHERE platform_name = ?", (platform_name,))
-    platform = c.fetchone()
-    c.close()
-    conn.close()
+    platform = get_platform(platform_name)
     if not platform:
         bot.send_message(call.message.chat.id, "Platform not found.")
         return
-    platform = dict(platform)  # Convert row to dictionary
-    stock = json.loads(platform["stock"] or "[]")
+    stock_count = platform["stock_count"] or 0
     price = platform["price"]
     p_type = platform.get("platform_type", "account")
     stock_type = "Cookie file" if p_type == "cookie" else "Login pass"
     text = (f"Platform Name: {platform_name}\n"
             f"Type: {p_type}\n"
             f"Stock Type: {stock_type}\n"
-            f"Accounts Available: {len(stock)}\n"
+            f"Accounts Available: {stock_count}\n"
             f"Price: {price} pts")
     markup = types.InlineKeyboardMarkup(row_width=1)
     markup.add(types.InlineKeyboardButton("➕ Add Stock", callback_data=f"admin_stock_add_{platform_name}"))
@@ -292,17 +337,10 @@ def handle_admin_stock_detail(bot, call, platform_name):
 
 
 def handle_admin_stock_add(bot, call, platform_name):
-    conn = __import__('db').get_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM platforms WHERE platform_name = ?", (platform_name,))
-    platform = c.fetchone()
-    c.close()
-    conn.close()
+    platform = get_platform(platform_name)
     if not platform:
         bot.send_message(call.message.chat.id, "Platform not found.")
         return
-    platform = dict(platform)  # Convert sqlite3.Row to dictionary
     p_type = platform.get("platform_type", "account")
     if p_type == "account":
         msg = bot.send_message(call.message.chat.id, f"Please send the stock text for account platform '{platform_name}':")
@@ -312,6 +350,16 @@ def handle_admin_stock_add(bot, call, platform_name):
         bot.register_next_step_handler(msg, lambda m: process_stock_upload_admin(bot, m, platform_name, p_type))
 
 
+def _duplicates_text(result):
+    """
+    Summary line for the duplicates an upload skipped (empty if there were none).
+    """
+    if not result["duplicates_in_file"] and not result["duplicates_in_db"]:
+        return ""
+    return (f"\nSkipped duplicates: {result['duplicates_in_file']} repeated in the upload, "
+            f"{result['duplicates_in_db']} already in stock.")
+
+
 def process_stock_upload_admin(bot, message, platform_name, platform_type, retries=3):
     """
     For 'account' type:
@@ -319,64 +367,16 @@ def process_stock_upload_admin(bot, message, platform_name, platform_type, retri
     For 'cookie' type:
       - We store each .txt file as a single item (no line splitting).
       - If it's a ZIP, we only parse .txt files, each one is 1 item in stock.
-    Merges new items with existing stock.
+        Folders and ZIPs inside the ZIP are walked too.
+    New items are appended to the platform's existing stock. The import runs
+    in the background (see stock_ingest.start_import).
     """
-    import io
-    import json
-    from zipfile import ZipFile, BadZipFile
-    from db import update_stock_for_platform, get_connection
-
-    # 1) Fetch existing stock from DB so we can merge instead of overwrite
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT stock FROM platforms WHERE platform_name = ?", (platform_name,))
-    row = c.fetchone()
-    c.close()
-    conn.close()
-
-    current_stock = json.loads(row["stock"]) if row and row["stock"] else []
-
-    # We'll store newly parsed items in new_stock
-    new_stock = []
-
     # -----------------------------------------------------------
     # ACCOUNT LOGIC
     # -----------------------------------------------------------
     if platform_type == "account":
-        # If it's a document, read the file
-        if message.content_type == "document":
-            for attempt in range(retries):
-                try:
-                    file_info = bot.get_file(message.document.file_id)
-                    downloaded_file = bot.download_file(file_info.file_path)
-                    try:
-                        data = downloaded_file.decode('utf-8')
-                    except UnicodeDecodeError:
-                        data = downloaded_file.decode('latin-1', errors='replace')
-                    break
-                except Exception as e:
-                    if attempt < retries - 1:
-                        import time
-                        time.sleep(2)
-                        continue
-                    else:
-                        bot.send_message(message.chat.id, f"Error downloading file: {e}")
-                        return
-        else:
-            # Otherwise assume user typed lines in text
-            data = message.text.strip()
-
-        lines = [line.strip() for line in data.splitlines() if line.strip()]
-        current_stock.extend(lines)  # Merge new lines with existing
-        update_stock_for_platform(platform_name, current_stock)
-
-        bot.send_message(
-            message.chat.id,
-            f"Stock for '{platform_name}' updated. "
-            f"{len(lines)} new items added. Total stock: {len(current_stock)}"
-        )
-        send_admin_menu(bot, message)
+        start_import(bot, message.chat.id, platform_name,
+                     lambda: _import_accounts(bot, message, platform_name, retries))
         return
 
     # -----------------------------------------------------------
@@ -388,47 +388,13 @@ def process_stock_upload_admin(bot, message, platform_name, platform_type, retri
             bot.send_message(message.chat.id, "Please send a TXT or ZIP file.")
             return
 
-        file_info = bot.get_file(message.document.file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        filename = message.document.file_name.lower()
-
-        # Single .txt => store entire file as one item
-        if filename.endswith(".txt"):
-            try:
-                content = downloaded_file.decode('utf-8')
-            except UnicodeDecodeError:
-                content = downloaded_file.decode('latin-1', errors='replace')
-            new_stock.append({"type": "cookie", "content": content})
-
-        # ZIP => for each .txt inside, store entire file as one item
-        elif filename.endswith(".zip"):
-            try:
-                zip_file = ZipFile(io.BytesIO(downloaded_file))
-                for f_name in zip_file.namelist():
-                    if f_name.lower().endswith(".txt"):
-                        with zip_file.open(f_name) as f:
-                            try:
-                                content = f.read().decode('utf-8')
-                            except UnicodeDecodeError:
-                                content = f.read().decode('latin-1', errors='replace')
-                            # Each .txt file => 1 item
-                            new_stock.append({"type": "cookie", "content": content})
-            except BadZipFile as e:
-                bot.send_message(message.chat.id, f"Invalid ZIP file: {e}")
-                return
-        else:
+        filename = (message.document.file_name or "").lower()
+        if not filename.endswith((".txt", ".zip")):
             bot.send_message(message.chat.id, "Unsupported file type. Please send a TXT or ZIP file.")
             return
 
-        # Merge new cookie items with existing stock
-        current_stock.extend(new_stock)
-        update_stock_for_platform(platform_name, current_stock)
-
-        bot.send_message(
-            message.chat.id,
-            f"Cookie stock updated. {len(new_stock)} new file(s) added. Total stock: {len(current_stock)}"
-        )
-        send_admin_menu(bot, message)
+        start_import(bot, message.chat.id, platform_name,
+                     lambda: _import_cookies(bot, message, platform_name, retries))
         return
 
     else:
@@ -436,6 +402,53 @@ def process_stock_upload_admin(bot, message, platform_name, platform_type, retri
         return
         send_admin_menu(bot, message)
 
+
+def _import_accounts(bot, message, platform_name, retries):
+    # Stream the file (or typed text) line by line into stock in chunks
+    try:
+        result = ingest_account_upload(bot, message, platform_name, retries=retries)
+    except Exception as e:
+        bot.send_message(message.chat.id, f"Error importing stock: {e}. Send the same file again to resume.")
+        return
+
+    if result["already_done"]:
+        text = f"This file was already imported into '{platform_name}'. Total stock: {result['total']}"
+    else:
+        text = (f"Stock for '{platform_name}' updated. "
+                f"{result['added']} new items added. Total stock: {result['total']}")
+        if result["skipped"]:
+            text += f" (resumed after {result['skipped']} items from an earlier attempt)"
+        text += _duplicates_text(result)
+    bot.send_message(message.chat.id, text)
+    send_admin_menu(bot, message)
+
+
+def _import_cookies(bot, message, platform_name, retries):
+    # Each .txt file (including those in nested folders / ZIPs) => 1 item
+    try:
+        result = ingest_cookie_upload(bot, message, platform_name, retries=retries)
+    except UploadTooLarge as e:
+        bot.send_message(message.chat.id, f"Upload rejected: {e}.")
+        return
+    except Exception as e:
+        bot.send_message(message.chat.id, f"Error importing cookies: {e}. Send the same file again to resume.")
+        return
+
+    if result["already_done"]:
+        text = f"This file was already imported into '{platform_name}'. Total stock: {result['total']}"
+    else:
+        text = (f"Cookie stock updated. {result['added']} new file(s) added. Total stock: {result['total']}"
+                + _duplicates_text(result))
+        errors = result["errors"]
+        if errors:
+            text += f"\n{len(errors)} file(s) skipped:"
+            for name, reason in errors[:COOKIE_ERRORS_SHOWN]:
+                text += f"\n- {name}: {reason}"
+            if len(errors) > COOKIE_ERRORS_SHOWN:
+                text += f"\n... and {len(errors) - COOKIE_ERRORS_SHOWN} more"
+    bot.send_message(message.chat.id, text)
+    send_admin_menu(bot, message)
+
 # ----------------- CHANNEL MANAGEMENT -----------------
 
 def add_channel(channel_link):
@@ -445,7 +458,7 @@ def add_channel(channel_link):
     conn.commit()
     c.close()
     conn.close()
-    log_event(telebot.TeleBot(config.TOKEN), "channel", f"Channel '{channel_link}' added.")
+    log_event(get_bot(), "channel", f"Channel '{channel_link}' added.")
 
 def remove_channel(channel_id):
     conn = __import__('db').get_connection()
@@ -454,7 +467,7 @@ def remove_channel(channel_id):
     conn.commit()
     c.close()
     conn.close()
-    log_event(telebot.TeleBot(config.TOKEN), "channel", f"Channel with ID '{channel_id}' removed.")
+    log_event(get_bot(), "channel", f"Channel with ID '{channel_id}' removed.")
 
 def get_channels():
     conn = __import__('db').get_connection()
@@ -539,23 +552,16 @@ def handle_admin_ban_unban(bot, call):
 
 def process_admin_ban_unban(bot, message):
     user_id = message.text.strip()
-    from db import get_connection
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM admins WHERE user_id = ?", (user_id,))
-    admin_doc = c.fetchone()
+    admin_doc = get_admin(user_id)
     if not admin_doc:
         response = "Admin not found."
     else:
         if admin_doc["banned"]:
-            unban_user(user_id)
+            set_admin_banned(user_id, False)
             response = f"Admin {user_id} has been unbanned."
         else:
-            ban_user(user_id)
+            set_admin_banned(user_id, True)
             response = f"Admin {user_id} has been banned."
-    c.close()
-    conn.close()
     bot.send_message(message.chat.id, response)
     send_admin_menu(bot, message)
 
@@ -565,13 +571,7 @@ def handle_admin_remove(bot, call):
 
 def process_admin_remove(bot, message):
     user_id = message.text.strip()
-    from db import get_connection
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
-    conn.commit()
-    c.close()
-    conn.close()
+    remove_admin(user_id)
     response = f"Admin {user_id} removed."
     bot.send_message(message.chat.id, response)
     send_admin_menu(bot, message)
@@ -586,16 +586,10 @@ def process_admin_add(bot, message):
         response = "Please provide both UserID and Username."
     else:
         user_id, username = parts[0], " ".join(parts[1:])
-        from db import get_connection
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("REPLACE INTO admins (user_id, username, role, banned) VALUES (?, ?, ?, 0)", (user_id, username, "admin"))
-        conn.commit()
-        c.close()
-        conn.close()
-        log_event(telebot.TeleBot(config.TOKEN), "admin", f"Admin '{user_id}' ({username}) added with role 'admin'.")
+        add_admin(user_id, username, "admin")
+        log_event(get_bot(), "admin", f"Admin '{user_id}' ({username}) added with role 'admin'.")
         try:
-            bot_instance = telebot.TeleBot(config.TOKEN)
+            bot_instance = get_bot()
             bot_instance.send_message(user_id, f"Congratulations, you have been added as an admin.")
         except Exception as e:
             print(f"Error notifying new admin {user_id}: {e}")
@@ -605,19 +599,9 @@ def process_admin_add(bot, message):
 
 # ----------------- USER MANAGEMENT (Admin Panel) -----------------
 
-def handle_user_management(bot, call):
-    from db import get_connection
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM users")
-    # Convert each row to a dictionary so .get() works
-    users = [dict(u) for u in c.fetchall()]
-    c.close()
-    conn.close()
-    if not users:
-        bot.answer_callback_query(call.id, "No users found.")
-        return
+USERS_PAGE_SIZE = 10
+
+def _user_list_markup(users, prev_before=None, next_after=None):
     markup = types.InlineKeyboardMarkup(row_width=1)
     for u in users:
         uid = u.get("telegram_id")
@@ -627,12 +611,50 @@ def handle_user_management(bot, call):
         btn_text = f"{username} ({uid}) - {status}"
         callback_data = f"admin_user_{uid}"
         markup.add(types.InlineKeyboardButton(btn_text, callback_data=callback_data))
+    nav = []
+    if prev_before is not None:
+        nav.append(types.InlineKeyboardButton("⬅️ Prev", callback_data=f"admin_users_prev_{prev_before}"))
+    if next_after is not None:
+        nav.append(types.InlineKeyboardButton("Next ➡️", callback_data=f"admin_users_next_{next_after}"))
+    if nav:
+        markup.row(*nav)
+    markup.add(types.InlineKeyboardButton("🔍 Search", callback_data="admin_users_search"))
     markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
+    return markup
+
+def handle_user_management(bot, call, after_id=None, before_id=None):
+    """
+    Paginated user browser: USERS_PAGE_SIZE users per page, keyset-paginated on telegram_id.
+    """
+    users, has_more = get_users_page(after_id=after_id, before_id=before_id, limit=USERS_PAGE_SIZE)
+    if not users:
+        bot.answer_callback_query(call.id, "No users found.")
+        return
+    if before_id is not None:
+        # Walking backwards: there is always a next page (the one we came from)
+        prev_before = users[0]["telegram_id"] if has_more else None
+        next_after = users[-1]["telegram_id"]
+    else:
+        prev_before = users[0]["telegram_id"] if after_id else None
+        next_after = users[-1]["telegram_id"] if has_more else None
+    markup = _user_list_markup(users, prev_before, next_after)
     bot.edit_message_text("User Management\nSelect a user to manage:", 
                             chat_id=call.message.chat.id,
                             message_id=call.message.message_id,
                             reply_markup=markup)
 
+def handle_user_search(bot, call):
+    msg = bot.send_message(call.message.chat.id, "Send a user ID or the start of a username to search:")
+    bot.register_next_step_handler(msg, lambda m: process_user_search(bot, m))
+
+def process_user_search(bot, message):
+    users = search_users(message.text or "", limit=USERS_PAGE_SIZE)
+    if not users:
+        bot.send_message(message.chat.id, "No matching users found.")
+        return
+    markup = _user_list_markup(users)
+    bot.send_message(message.chat.id, "Search results\nSelect a user to manage:", reply_markup=markup)
+
 def handle_user_management_detail(bot, call, user_id):
     user = get_user(user_id)  # get_user returns a dictionary
     if not user:
@@ -674,6 +696,39 @@ def handle_user_ban_action(bot, call, user_id, action):
     bot.answer_callback_query(call.id, result_text)
     handle_user_management_detail(bot, call, user_id)
 
+# ----------------- DASHBOARD -----------------
+
+def handle_admin_dashboard(bot, call):
+    stats = get_admin_dashboard()
+    text = ("📊 Dashboard\n\n"
+            f"Total Users: {stats['total_users']}\n"
+            f"Verified Users: {stats['verified_users']}\n"
+            f"Banned Users: {stats['banned_users']}\n"
+            f"Points in Circulation: {stats['total_points']} pts\n"
+            f"Unredeemed Keys: {stats['outstanding_keys']}\n"
+            f"Total Stock: {stats['total_stock']}\n")
+    for plat_name, count in stats["platform_stock"].items():
+        text += f"• {plat_name}: {count}\n"
+    cache = user_cache_stats()
+    lookups = cache["hits"] + cache["misses"]
+    if lookups:
+        text += f"\nUser Cache: {cache['size']} rows, {100 * cache['hits'] // lookups}% hits\n"
+    throttle = getattr(bot, "throttle", None)
+    if throttle is not None:
+        flood = throttle.stats()
+        text += (f"Throttled: {flood['throttled_messages']} messages, {flood['throttled_callbacks']} buttons "
+                 f"({flood['allowed']} allowed)\n")
+        top = sorted(flood["by_command"].items(), key=lambda kv: kv[1], reverse=True)[:5]
+        if top:
+            text += "Most throttled: " + ", ".join(f"{name} {count}" for name, count in top) + "\n"
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="menu_admin"))
+    try:
+        bot.edit_message_text(text, chat_id=call.message.chat.id,
+                              message_id=call.message.message_id, reply_markup=markup)
+    except Exception:
+        bot.send_message(call.message.chat.id, text, reply_markup=markup)
+
 # ----------------- ADMIN CALLBACK HANDLER -----------------
 
 def admin_callback_handler(bot, call):
@@ -749,8 +804,16 @@ def admin_callback_handler(bot, call):
         handle_admin_remove(bot, call)
     elif data == "admin_add":
         handle_admin_add(bot, call)
+    elif data == "admin_dashboard":
+        handle_admin_dashboard(bot, call)
     elif data == "admin_users":
         handle_user_management(bot, call)
+    elif data.startswith("admin_users_next_"):
+        handle_user_management(bot, call, after_id=data[len("admin_users_next_"):])
+    elif data.startswith("admin_users_prev_"):
+        handle_user_management(bot, call, before_id=data[len("admin_users_prev_"):])
+    elif data == "admin_users_search":
+        handle_user_search(bot, call)
     elif data.startswith("admin_user_") and data.count("_") == 2:
         user_id = data.split("_")[2]
         handle_user_management_detail(bot, call, user_id)
@@ -777,6 +840,7 @@ def send_admin_menu(bot, update):
         types.InlineKeyboardButton("👤 User Mgmt", callback_data="admin_users"),
         types.InlineKeyboardButton("➕ Add Admin", callback_data="admin_add")
     )
+    markup.add(types.InlineKeyboardButton("📊 Dashboard", callback_data="admin_dashboard"))
     markup.add(types.InlineKeyboardButton("🔙 Main Menu", callback_data="back_main"))
     try:
         if hasattr(update, "message") and update.message:
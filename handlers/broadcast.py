@@ -0,0 +1,169 @@
+# handlers/broadcast.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db import (
+    get_broadcast_recipients,
+    create_broadcast_job,
+    get_broadcast_job,
+    get_running_broadcast_jobs,
+    update_broadcast_job,
+    mark_user_blocked,
+    rollback_open_transaction,
+)
+from handlers.logs import log_event
+
+BROADCAST_RATE = 30            # messages per second across all workers (Telegram's global limit)
+BROADCAST_WORKERS = 8
+BROADCAST_BATCH_SIZE = 500     # recipients read per query; progress is saved after each batch
+BROADCAST_PROGRESS_EVERY = 10  # seconds between progress message edits
+BROADCAST_MAX_RETRIES = 3      # attempts per recipient after a RetryAfter (429)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Stop handing out tokens for the given time (used after a 429 RetryAfter).
+        """
+        with self.lock:
+            self.tokens = 0
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+_bucket = TokenBucket(BROADCAST_RATE)
+_executor = ThreadPoolExecutor(max_workers=BROADCAST_WORKERS, thread_name_prefix="broadcast")
+_active_jobs = set()
+_active_lock = threading.Lock()
+
+
+def _send_one(bot, user_id, text):
+    """
+    Deliver one message. Returns 'delivered', 'blocked' or 'failed'.
+    """
+    for attempt in range(BROADCAST_MAX_RETRIES):
+        _bucket.acquire()
+        try:
+            bot.send_message(user_id, text)
+            return "delivered"
+        except Exception as e:
+            error_code = getattr(e, "error_code", None)
+            if error_code == 429:
+                result_json = getattr(e, "result_json", None) or {}
+                retry_after = (result_json.get("parameters") or {}).get("retry_after", 5)
+                _bucket.pause(retry_after)
+                time.sleep(retry_after)
+                continue
+            if error_code == 403:
+                # Bot was blocked or the account was deactivated
+                try:
+                    mark_user_blocked(user_id)
+                finally:
+                    rollback_open_transaction()
+                return "blocked"
+            print(f"Error sending broadcast to {user_id}: {e}")
+            return "failed"
+    return "failed"
+
+
+def _progress_text(job, finished=False):
+    title = "📣 Broadcast finished" if finished else "📣 Broadcast in progress..."
+    return (f"{title}\n"
+            f"✅ Delivered: {job['delivered']}\n"
+            f"🚫 Blocked: {job['blocked']}\n"
+            f"⚠️ Failed: {job['failed']}")
+
+
+def _report_progress(bot, job, finished=False):
+    text = _progress_text(job, finished)
+    try:
+        if job.get("progress_message_id"):
+            bot.edit_message_text(text, chat_id=job["chat_id"], message_id=job["progress_message_id"])
+        else:
+            msg = bot.send_message(job["chat_id"], text)
+            job["progress_message_id"] = msg.message_id
+            update_broadcast_job(job["id"], progress_message_id=msg.message_id)
+    except Exception as e:
+        print(f"Error updating broadcast progress: {e}")
+
+
+def _run_job(bot, job_id):
+    job = get_broadcast_job(job_id)
+    if not job or job["status"] != "running":
+        return
+    last_report = 0
+    while True:
+        recipients = get_broadcast_recipients(job["last_user_id"], BROADCAST_BATCH_SIZE)
+        if not recipients:
+            break
+        for result in _executor.map(lambda uid: _send_one(bot, uid, job["text"]), recipients):
+            job[result] += 1
+        job["last_user_id"] = recipients[-1]
+        update_broadcast_job(job_id, last_user_id=job["last_user_id"], delivered=job["delivered"],
+                             blocked=job["blocked"], failed=job["failed"])
+        if time.monotonic() - last_report >= BROADCAST_PROGRESS_EVERY:
+            _report_progress(bot, job)
+            last_report = time.monotonic()
+    update_broadcast_job(job_id, status="done")
+    _report_progress(bot, job, finished=True)
+    log_event(bot, "broadcast", f"Broadcast #{job_id} by {job['admin_id']} finished: "
+                                f"{job['delivered']} delivered, {job['blocked']} blocked, {job['failed']} failed.")
+
+
+def _run_job_thread(bot, job_id):
+    try:
+        _run_job(bot, job_id)
+    except Exception as e:
+        print(f"Broadcast #{job_id} stopped: {e}")
+    finally:
+        rollback_open_transaction()
+        with _active_lock:
+            _active_jobs.discard(job_id)
+
+
+def _start_job(bot, job_id):
+    with _active_lock:
+        if job_id in _active_jobs:
+            return
+        _active_jobs.add(job_id)
+    threading.Thread(target=_run_job_thread, args=(bot, job_id), name=f"broadcast-{job_id}", daemon=True).start()
+
+
+def start_broadcast(bot, admin_id, chat_id, text):
+    """
+    Create a broadcast job and run it in the background. Returns the job id.
+    """
+    job_id = create_broadcast_job(str(admin_id), str(chat_id), text)
+    _start_job(bot, job_id)
+    return job_id
+
+
+def resume_broadcasts(bot):
+    """
+    Restart every broadcast that was still running when the process stopped.
+    Each resumes after the last recipient whose batch was saved.
+    """
+    for job_id in get_running_broadcast_jobs():
+        _start_job(bot, job_id)
@@ -0,0 +1,58 @@
+# handlers/context.py
+from datetime import datetime
+from db import get_user, upsert_user
+from handlers.admin import is_admin
+
+# Per-update user context: the sender's row (created on first contact), ban
+# status and role, loaded once by the middleware in main.py and read by the
+# handlers instead of calling get_user again. The row comes from the user
+# cache; only new users, renamed users and users returning after blocking the
+# bot cost a write.
+
+_NO_CONTEXT = {"user": None, "banned": False, "admin": False}
+
+
+def load_user_context(from_user, message=None):
+    telegram_id = str(from_user.id)
+    username = from_user.username or from_user.first_name
+    user = get_user(telegram_id)
+    if user is None or user.username != username or user.blocked_bot:
+        pending_ref = None
+        if user is None and message is not None and (getattr(message, "text", None) or "").startswith("/start"):
+            from handlers.referral import extract_referral_code
+            pending_ref = extract_referral_code(message)
+        user = upsert_user(telegram_id, username, datetime.now().strftime("%Y-%m-%d"),
+                           pending_referrer=pending_ref)
+    return {"user": user, "banned": bool(user.get("banned", 0)), "admin": is_admin(telegram_id)}
+
+
+def attach_user_context(update):
+    """
+    Middleware body for messages and callback queries. For a callback the
+    context is also attached to call.message, whose own sender is the bot.
+    """
+    from_user = getattr(update, "from_user", None)
+    if from_user is None or from_user.is_bot:
+        return
+    if hasattr(update, "data"):
+        context = load_user_context(from_user)
+        if update.message is not None:
+            update.message.user_context = context
+    else:
+        context = load_user_context(from_user, update)
+    update.user_context = context
+
+
+def user_context(update):
+    """
+    The context attached to a message or callback query, loading it if the
+    middleware did not run (e.g. a message sent by the bot itself).
+    """
+    context = getattr(update, "user_context", None)
+    if context is None:
+        from_user = getattr(update, "from_user", None)
+        if from_user is None or from_user.is_bot:
+            return _NO_CONTEXT
+        attach_user_context(update)
+        context = update.user_context
+    return context
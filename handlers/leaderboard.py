@@ -0,0 +1,28 @@
+# handlers/leaderboard.py
+from telebot import types
+from db import get_leaderboard, get_user_rank, get_user
+
+LEADERBOARD_SIZE = 10
+
+def send_leaderboard(bot, chat_id, telegram_id):
+    """
+    Show the top users by points and the requesting user's own rank.
+    """
+    leaderboard = get_leaderboard(LEADERBOARD_SIZE)
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    text = "🏆 LEADERBOARD 🏆\n══════ ⌁ ══════\n"
+    if not leaderboard:
+        text += "No users yet.\n"
+    for position, row in enumerate(leaderboard, start=1):
+        label = medals.get(position, f"{position}.")
+        text += f"{label} {row.get('username') or row.get('telegram_id')} — {row.get('points')} pts\n"
+    text += "══════ ⌁ ══════\n"
+    rank = get_user_rank(str(telegram_id))
+    if rank is not None:
+        user = get_user(str(telegram_id))
+        text += f"📍 Your rank: #{rank} ({user.get('points', 0)} pts)"
+    else:
+        text += "📍 Use /start to join the leaderboard."
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
+    bot.send_message(chat_id, text, reply_markup=markup)
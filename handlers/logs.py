@@ -1,9 +1,149 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
 import config
 
+# Log events are queued and delivered by a background thread that packs them
+# into as few channel messages as possible, so callers never wait on Telegram.
+LOG_QUEUE_SIZE = 10000         # events held before the queue policy kicks in
+LOG_QUEUE_POLICY = "drop_oldest"  # 'drop_oldest', 'drop_newest' or 'block'
+LOG_FLUSH_INTERVAL = 2.0       # seconds to collect events before sending a batch
+LOG_MAX_MESSAGE = 4096         # Telegram message length limit
+# Events that cannot be delivered to the channel are appended here (None disables).
+LOG_FALLBACK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "logs_fallback.jsonl")
+
+
+class LogSink:
+    """
+    Bounded queue drained by one worker thread. Queued lines are joined into
+    batches of up to LOG_MAX_MESSAGE characters and sent every
+    LOG_FLUSH_INTERVAL seconds (or as soon as a batch is full).
+    """
+
+    def __init__(self, maxsize=LOG_QUEUE_SIZE, policy=LOG_QUEUE_POLICY,
+                 flush_interval=LOG_FLUSH_INTERVAL, fallback_path=LOG_FALLBACK_FILE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.policy = policy
+        self.flush_interval = flush_interval
+        self.fallback_path = fallback_path
+        self.bot = None
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, bot, text):
+        self.bot = bot
+        self._ensure_started()
+        text = text[:LOG_MAX_MESSAGE]
+        if self.policy == "block":
+            self.queue.put(text)
+            return
+        try:
+            self.queue.put_nowait(text)
+        except queue.Full:
+            if self.policy == "drop_oldest":
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    self.queue.put_nowait(text)
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set() or not self.queue.empty():
+            try:
+                first = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch, size = [first], len(first)
+            deadline = time.monotonic() + self.flush_interval
+            while not self._stop.is_set():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    text = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if size + 1 + len(text) > LOG_MAX_MESSAGE:
+                    self._send(batch)
+                    batch, size = [], 0
+                batch.append(text)
+                size += len(text) + (1 if size else 0)
+            if self._stop.is_set():
+                # Shutting down: take whatever is left without waiting.
+                while True:
+                    try:
+                        text = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if size + 1 + len(text) > LOG_MAX_MESSAGE:
+                        self._send(batch)
+                        batch, size = [], 0
+                    batch.append(text)
+                    size += len(text) + (1 if size else 0)
+            if batch:
+                self._send(batch)
+
+    def _send(self, batch):
+        try:
+            # Plain text: events carry user input (names, command arguments), and
+            # None would fall back to the bot's default HTML parse mode.
+            self.bot.send_message(config.LOGS_CHANNEL, "\n".join(batch), parse_mode="")
+            self.sent += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Error sending log event: {e}")
+            self._write_fallback(batch)
+
+    def _write_fallback(self, batch):
+        if not self.fallback_path:
+            return
+        try:
+            with open(self.fallback_path, "a", encoding="utf-8") as f:
+                for text in batch:
+                    f.write(json.dumps({"time": time.time(), "message": text}, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Error writing log fallback file: {e}")
+
+    def stop(self, timeout=10):
+        """
+        Deliver everything still queued, then stop the worker.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {"queued": self.queue.qsize(), "sent": self.sent, "dropped": self.dropped, "failed": self.failed}
+
+
+log_sink = LogSink()
+atexit.register(log_sink.stop)
+
+
 def log_event(bot, event_type, message, user=None):
     """
-    Send a log message to the channel defined in config.LOGS_CHANNEL.
+    Queue a log message for the channel defined in config.LOGS_CHANNEL.
     If a user object is provided, include both user ID and username (or first name if username is missing).
+    Returns immediately; delivery happens on the log sink's worker thread.
     """
     if user:
         uname = user.username if (hasattr(user, "username") and user.username) else user.first_name
@@ -11,7 +151,4 @@ def log_event(bot, event_type, message, user=None):
         full_message = f"[{event_type.upper()}] {user_info} - {message}"
     else:
         full_message = f"[{event_type.upper()}] {message}"
-    try:
-        bot.send_message(config.LOGS_CHANNEL, full_message)
-    except Exception as e:
-        print(f"Error sending log event: {e}")
+    log_sink.submit(bot, full_message)
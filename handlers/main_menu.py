@@ -1,17 +1,12 @@
 from telebot import types
-from db import get_user
-from handlers.admin import is_admin
+from handlers.context import user_context
 
 def send_main_menu(bot, update):
     if hasattr(update, "message") and update.message:
         chat_id = update.message.chat.id
-        user = get_user(str(update.message.from_user.id))
-    elif hasattr(update, "from_user") and update.from_user:
-        chat_id = update.message.chat.id if hasattr(update, "message") and update.message else update.chat.id
-        user = get_user(str(update.from_user.id))
     else:
         chat_id = update.chat.id
-        user = get_user(str(update.from_user.id))
+    context = user_context(update)
     
     markup = types.InlineKeyboardMarkup(row_width=3)
     markup.add(
@@ -24,7 +19,8 @@ def send_main_menu(bot, update):
         types.InlineKeyboardButton("📣 Report", callback_data="menu_report"),
         types.InlineKeyboardButton("💬 Support", callback_data="menu_support")
     )
-    if is_admin(user):
+    markup.add(types.InlineKeyboardButton("🏆 Leaderboard", callback_data="menu_leaderboard"))
+    if context["admin"]:
         markup.add(types.InlineKeyboardButton("🔨 Admin Panel", callback_data="menu_admin"))
     bot.send_message(chat_id, "Main Menu\nPlease choose an option:", reply_markup=markup)
         
@@ -1,26 +1,38 @@
 import telebot
 from telebot import types
-import random
 import config
+import html
 import io
-import json
-import sqlite3
-from db import get_user, update_user_points, get_account_claim_cost, get_platforms
+from db import get_account_claim_cost, get_platform_catalog, get_platform, claim_stock_item, release_stock_item
 from handlers.logs import log_event
+from blob_store import open_blob
 
-def send_rewards_menu(bot, message):
-    platforms = get_platforms()
-    if not platforms:
-        bot.send_message(message.chat.id, "😢 No platforms available at the moment.")
-        return
+# Rewards keyboard, rebuilt only when the platform catalog or the default claim cost changes
+_rewards_menu = None
+
+def _rewards_markup(platforms, version):
+    global _rewards_menu
+    default_cost = get_account_claim_cost()
+    cached = _rewards_menu
+    if cached and cached[0] == (version, default_cost):
+        return cached[1]
     markup = types.InlineKeyboardMarkup(row_width=1)
     for platform in platforms:
         platform_name = platform.get("platform_name")
-        stock = json.loads(platform.get("stock") or "[]")
-        price = platform.get("price") or get_account_claim_cost()
-        btn_text = f"{platform_name} | Stock: {len(stock)} | Price: {price} pts"
+        stock_count = platform.get("stock_count") or 0
+        price = platform.get("price") or default_cost
+        btn_text = f"{platform_name} | Stock: {stock_count} | Price: {price} pts"
         markup.add(types.InlineKeyboardButton(btn_text, callback_data=f"reward_{platform_name}"))
     markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
+    _rewards_menu = ((version, default_cost), markup)
+    return markup
+
+def send_rewards_menu(bot, message):
+    version, platforms = get_platform_catalog()
+    if not platforms:
+        bot.send_message(message.chat.id, "😢 No platforms available at the moment.")
+        return
+    markup = _rewards_markup(platforms, version)
     try:
         bot.edit_message_text("<b>🎯 Available Platforms 🎯</b>",
                               chat_id=message.chat.id,
@@ -31,20 +43,14 @@ def send_rewards_menu(bot, message):
                          parse_mode="HTML", reply_markup=markup)
 
 def handle_platform_selection(bot, call, platform_name):
-    conn = __import__('db').get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM platforms WHERE platform_name = ?", (platform_name,))
-    platform = c.fetchone()
-    c.close()
-    conn.close()
+    platform = get_platform(platform_name)
     if not platform:
         bot.send_message(call.message.chat.id, "Platform not found.")
         return
-    platform = dict(platform)
-    stock = json.loads(platform["stock"] or "[]")
+    stock_count = platform["stock_count"] or 0
     price = platform["price"] or get_account_claim_cost()
-    if stock:
-        text = f"<b>{platform_name}</b>:\n✅ Accounts Available: {len(stock)}\nPrice: {price} pts per account"
+    if stock_count:
+        text = f"<b>{platform_name}</b>:\n✅ Accounts Available: {stock_count}\nPrice: {price} pts per account"
         markup = types.InlineKeyboardMarkup(row_width=1)
         markup.add(types.InlineKeyboardButton("🎁 Claim Account", callback_data=f"claim_{platform_name}"))
     else:
@@ -59,20 +65,25 @@ def handle_platform_selection(bot, call, platform_name):
     except Exception:
         bot.send_message(call.message.chat.id, text, parse_mode="HTML", reply_markup=markup)
 
-def send_premium_account_info(bot, chat_id, platform_name, account_info):
-    if isinstance(account_info, dict) and account_info.get("type") == "cookie":
-        cookie_content = account_info.get("content", "No details found")
-        # Create an in-memory text file
-        file_stream = io.BytesIO(cookie_content.encode("utf-8"))
-        file_stream.name = f"{platform_name}.txt"
+def send_premium_account_info(bot, chat_id, platform_name, item):
+    if item.item_type == "cookie":
+        if item.content is None:
+            # Upload straight from the compressed blob, decompressing as it is read
+            file_stream = open_blob(item.content_hash, name=f"{platform_name}.txt")
+        else:
+            # Create an in-memory text file
+            file_stream = io.BytesIO(item.content.encode("utf-8"))
+            file_stream.name = f"{platform_name}.txt"
         markup = types.InlineKeyboardMarkup()
         markup.add(types.InlineKeyboardButton("Report", callback_data="menu_report"))
-        bot.send_document(chat_id, file_stream, caption=f"🎁 Here is your cookie for {platform_name}", reply_markup=markup)
+        with file_stream:
+            bot.send_document(chat_id, file_stream, caption=f"🎁 Here is your cookie for {platform_name}", reply_markup=markup)
     else:
+        account_info = item.content
         text = f"""🎉✨ PREMIUM ACCOUNT UNLOCKED ✨🎉
 📦 Service: {platform_name}
 🔑 Your Account:
-<code>{account_info}</code>
+<code>{html.escape(account_info)}</code>
 📌 How to login:
 1️⃣ Copy the details
 2️⃣ Open app/website
@@ -85,41 +96,28 @@ By @shadowsquad0"""
 
 def claim_account(bot, call, platform_name):
     user_id = str(call.from_user.id)
-    user = get_user(user_id)
-    if user is None:
+    # Charge the user and reserve one item in a single transaction
+    result = claim_stock_item(platform_name, user_id)
+    status = result["status"]
+    if status == "no_user":
         bot.send_message(call.message.chat.id, "User not found. Please /start the bot first.")
         return
-    # Retrieve platform details
-    conn = __import__('db').get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM platforms WHERE platform_name = ?", (platform_name,))
-    platform = c.fetchone()
-    c.close()
-    conn.close()
-    if not platform:
+    if status == "no_platform":
         bot.send_message(call.message.chat.id, "Platform not found.")
         return
-    # Convert platform to dictionary
-    platform = dict(platform)
-    stock = json.loads(platform["stock"] or "[]")
-    price = platform["price"] or get_account_claim_cost()
-    try:
-        current_points = int(user.get("points", 0))
-    except Exception as e:
-        bot.send_message(call.message.chat.id, f"Error reading your points: {e}")
+    if status == "insufficient":
+        bot.send_message(call.message.chat.id, f"Insufficient points (each account costs {result['price']} pts). Earn more via referrals or keys.")
         return
-    if current_points < price:
-        bot.send_message(call.message.chat.id, f"Insufficient points (each account costs {price} pts). Earn more via referrals or keys.")
-        return
-    if not stock:
+    if status == "out_of_stock":
         bot.send_message(call.message.chat.id, "No accounts available.")
         return
-    # Always remove the claimed account from stock regardless of type
-    index = random.randint(0, len(stock) - 1)
-    account = stock.pop(index)
-    send_premium_account_info(bot, call.message.chat.id, platform_name, account)
-    from db import update_stock_for_platform, update_user_points
-    update_stock_for_platform(platform_name, stock)
-    new_points = current_points - price
-    update_user_points(user_id, new_points)
-    bot.send_message(call.message.chat.id, f"Your new balance: {new_points} pts.")
+    # Deliver only after the claim is committed; refund if delivery fails
+    try:
+        send_premium_account_info(bot, call.message.chat.id, platform_name, result["item"])
+    except Exception as e:
+        release_stock_item(result["item_id"], user_id, result["price"])
+        print(f"Error delivering {platform_name} item to user {user_id}: {e}")
+        log_event(bot, "stock", f"{platform_name} item #{result['item_id']} set aside: delivery failed ({e}).")
+        bot.send_message(call.message.chat.id, "Could not deliver the account. Your points have been refunded.")
+        return
+    bot.send_message(call.message.chat.id, f"Your new balance: {result['points']} pts.")
@@ -0,0 +1,334 @@
+# handlers/stock_ingest.py
+import codecs
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from bot_client import get_session, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+from db import ingest_stock_items, rollback_open_transaction
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+PROGRESS_INTERVAL = 5  # seconds between progress message edits
+
+
+def stream_document(bot, file_id, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Yield the bytes of a Telegram file chunk by chunk, without holding the whole file.
+    """
+    url = bot.get_file_url(file_id)
+    response = get_session().get(url, stream=True, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    try:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        response.close()
+
+
+def iter_lines(byte_chunks):
+    """
+    Decode byte chunks incrementally and yield stripped, non-empty lines.
+    Decodes as UTF-8; from the first invalid byte on, the rest of the file
+    is decoded as Latin-1 instead (text before that byte stays UTF-8).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in byte_chunks:
+        try:
+            text = decoder.decode(chunk)
+        except UnicodeDecodeError as e:
+            # e.object is the decoder's buffered bytes plus this chunk
+            decoder = codecs.getincrementaldecoder("latin-1")()
+            text = e.object[:e.start].decode("utf-8") + decoder.decode(e.object[e.start:])
+        lines = (pending + text).splitlines(keepends=True)
+        pending = ""
+        if lines and not lines[-1].endswith(("\n", "\r")):
+            pending = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+    pending = (pending + decoder.decode(b"", final=True)).strip()
+    if pending:
+        yield pending
+
+
+class ProgressReporter:
+    """
+    Posts one status message and edits it at most every PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, bot, chat_id, label):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.label = label
+        self.message_id = None
+        self.last_update = time.monotonic()
+
+    def __call__(self, count):
+        if time.monotonic() - self.last_update < PROGRESS_INTERVAL:
+            return
+        self.last_update = time.monotonic()
+        text = f"⏳ {self.label}: {count} items processed..."
+        try:
+            if self.message_id is None:
+                self.message_id = self.bot.send_message(self.chat_id, text).message_id
+            else:
+                self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+        except Exception as e:
+            print(f"Error updating upload progress: {e}")
+
+
+# Imports run on their own threads (like broadcasts), one per platform at a
+# time, so a large upload does not hold up the admin's dispatch lane and
+# every user hashed to it.
+_active_imports = set()
+_active_lock = threading.Lock()
+
+
+def _run_import_thread(platform_name, work):
+    try:
+        work()
+    except Exception as e:
+        print(f"Stock import for '{platform_name}' stopped: {e}")
+    finally:
+        rollback_open_transaction()
+        with _active_lock:
+            _active_imports.discard(platform_name)
+
+
+def start_import(bot, chat_id, platform_name, work):
+    """
+    Run work() (an import that reports its own progress and result) in the
+    background. Returns False, after telling the admin, if an import into
+    the platform is already running.
+    """
+    with _active_lock:
+        if platform_name in _active_imports:
+            busy = True
+        else:
+            busy = False
+            _active_imports.add(platform_name)
+    if busy:
+        bot.send_message(chat_id, f"An import into '{platform_name}' is still running. "
+                                  "Send the file again once it has finished.")
+        return False
+    bot.send_message(chat_id, f"⏳ Importing into '{platform_name}' in the background. "
+                              "You will get a message when it is done.")
+    threading.Thread(target=_run_import_thread, args=(platform_name, work),
+                     name=f"stock-import-{platform_name}", daemon=True).start()
+    return True
+
+
+def ingest_account_upload(bot, message, platform_name, retries=3):
+    """
+    Stream an account list (document or typed text) into a platform's stock,
+    one account per line. Document uploads are keyed by file_unique_id, so a
+    failed download is retried from the last committed chunk and re-sending
+    the same file does not add it twice.
+    Returns the ingest_stock_items result dict.
+    """
+    progress = ProgressReporter(bot, message.chat.id, f"Importing stock for '{platform_name}'")
+    if message.content_type != "document":
+        # Typed text: already in memory, no download to resume
+        return ingest_stock_items(platform_name, iter_lines([(message.text or "").encode("utf-8")]),
+                                  progress=progress)
+    upload_id = f"{platform_name}:{message.document.file_unique_id}"
+    for attempt in range(retries):
+        try:
+            lines = iter_lines(stream_document(bot, message.document.file_id))
+            return ingest_stock_items(platform_name, lines, upload_id=upload_id, progress=progress)
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            print(f"Stock upload for '{platform_name}' interrupted ({e}); retrying...")
+            time.sleep(2)
+
+
+# Cookie packs: every .txt file is one stock item. ZIPs may contain folders and
+# further ZIPs; the limits below guard against zip bombs.
+COOKIE_MAX_FILE_SIZE = 1024 * 1024           # uncompressed bytes per cookie file
+COOKIE_MAX_TOTAL_SIZE = 512 * 1024 * 1024    # uncompressed bytes per upload
+COOKIE_MAX_FILES = 200000
+COOKIE_MAX_ZIP_DEPTH = 3                      # ZIPs nested inside the uploaded ZIP
+COOKIE_DECODE_WORKERS = 8
+COOKIE_DECODE_BATCH = 64                      # members read concurrently per round
+COOKIE_ERRORS_SHOWN = 10
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _decode_cookie(data):
+    """
+    Decode a cookie file as UTF-8, falling back to Latin-1.
+    """
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1", errors="replace")
+
+
+class CookiePackReader:
+    """
+    Walks a TXT or ZIP upload and yields cookie stock items, reading and
+    decoding ZIP members on a thread pool. Files that cannot be used are
+    recorded in self.errors as (name, reason) instead of failing the upload.
+    """
+
+    def __init__(self, max_file_size=COOKIE_MAX_FILE_SIZE, max_total_size=COOKIE_MAX_TOTAL_SIZE,
+                 max_files=COOKIE_MAX_FILES, workers=COOKIE_DECODE_WORKERS):
+        self.max_file_size = max_file_size
+        self.max_total_size = max_total_size
+        self.max_files = max_files
+        self.workers = workers
+        self.total_size = 0
+        self.files = 0
+        self.errors = []
+
+    def _account(self, size):
+        self.total_size += size
+        if self.total_size > self.max_total_size:
+            raise UploadTooLarge(f"upload exceeds {self.max_total_size // (1024 * 1024)} MB uncompressed")
+
+    def _read_member(self, zip_file, info):
+        """
+        Read one member, never trusting the size in the ZIP header.
+        Returns (name, bytes read, text, error).
+        """
+        if info.file_size > self.max_file_size:
+            return info.filename, 0, None, "file too large"
+        try:
+            with zip_file.open(info) as f:
+                data = f.read(self.max_file_size + 1)
+        except Exception as e:
+            return info.filename, 0, None, f"unreadable ({e})"
+        if len(data) > self.max_file_size:
+            return info.filename, len(data), None, "file too large"
+        text = _decode_cookie(data)
+        if not text.strip():
+            return info.filename, len(data), None, "empty file"
+        return info.filename, len(data), text, None
+
+    def _walk_zip(self, fileobj, prefix, depth, pool):
+        try:
+            zip_file = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile as e:
+            self.errors.append((prefix or "upload", f"invalid ZIP ({e})"))
+            return
+        with zip_file:
+            members = []
+            for info in zip_file.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("._"):
+                    continue
+                lower = name.lower()
+                if lower.endswith(".zip"):
+                    if depth >= COOKIE_MAX_ZIP_DEPTH:
+                        self.errors.append((prefix + name, "ZIP nested too deeply"))
+                        continue
+                    yield from self._walk_nested(zip_file, info, prefix + name + "/", depth + 1, pool)
+                elif lower.endswith(".txt"):
+                    members.append(info)
+            for start in range(0, len(members), COOKIE_DECODE_BATCH):
+                batch = members[start:start + COOKIE_DECODE_BATCH]
+                for name, size, text, error in pool.map(lambda info: self._read_member(zip_file, info), batch):
+                    self._account(size)
+                    if error:
+                        self.errors.append((prefix + name, error))
+                        continue
+                    self.files += 1
+                    if self.files > self.max_files:
+                        raise UploadTooLarge(f"upload contains more than {self.max_files} files")
+                    yield {"type": "cookie", "content": text}
+
+    def _walk_nested(self, zip_file, info, prefix, depth, pool):
+        # Spool the inner ZIP to a temporary file (it must be seekable). Its
+        # size counts towards the upload limit while it is being extracted.
+        with tempfile.TemporaryFile() as tmp:
+            try:
+                with zip_file.open(info) as f:
+                    for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                        self._account(len(chunk))
+                        tmp.write(chunk)
+            except UploadTooLarge:
+                raise
+            except Exception as e:
+                self.errors.append((prefix.rstrip("/"), f"unreadable ({e})"))
+                return
+            tmp.seek(0)
+            yield from self._walk_zip(tmp, prefix, depth, pool)
+
+    def read(self, fileobj, filename):
+        """
+        Yield cookie items from an uploaded file object (TXT or ZIP).
+        """
+        lower = filename.lower()
+        if lower.endswith(".txt"):
+            data = fileobj.read(self.max_file_size + 1)
+            if len(data) > self.max_file_size:
+                self.errors.append((filename, "file too large"))
+            elif not data.strip():
+                self.errors.append((filename, "empty file"))
+            else:
+                self.files += 1
+                yield {"type": "cookie", "content": _decode_cookie(data)}
+        elif lower.endswith(".zip"):
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cookie-decode") as pool:
+                yield from self._walk_zip(fileobj, "", 0, pool)
+        else:
+            self.errors.append((filename, "unsupported file type"))
+
+
+def _download_to_tempfile(bot, file_id, max_size):
+    """
+    Stream a Telegram file into an anonymous temporary file and return it, rewound.
+    """
+    tmp = tempfile.TemporaryFile()
+    try:
+        size = 0
+        for chunk in stream_document(bot, file_id):
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(f"file exceeds {max_size // (1024 * 1024)} MB")
+            tmp.write(chunk)
+        tmp.seek(0)
+        return tmp
+    except Exception:
+        tmp.close()
+        raise
+
+
+def ingest_cookie_upload(bot, message, platform_name, retries=3):
+    """
+    Stream a TXT or ZIP cookie upload into a platform's stock, one item per
+    .txt file, in chunked inserts. Like account uploads, documents are keyed
+    by file_unique_id so an interrupted import resumes where it stopped.
+    Returns the ingest_stock_items result dict plus 'files' (cookie files
+    read) and 'errors' (list of (file name, reason) for skipped files).
+    """
+    document = message.document
+    progress = ProgressReporter(bot, message.chat.id, f"Importing cookies for '{platform_name}'")
+    upload_id = f"{platform_name}:{document.file_unique_id}"
+    for attempt in range(retries):
+        try:
+            tmp = _download_to_tempfile(bot, document.file_id, COOKIE_MAX_TOTAL_SIZE)
+            break
+        except UploadTooLarge:
+            raise
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            print(f"Cookie upload for '{platform_name}' interrupted ({e}); retrying...")
+            time.sleep(2)
+    with tmp:
+        reader = CookiePackReader()
+        result = ingest_stock_items(platform_name, reader.read(tmp, document.file_name or ""),
+                                    upload_id=upload_id, progress=progress)
+    result["files"] = reader.files
+    result["errors"] = reader.errors
+    return result
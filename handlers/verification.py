@@ -1,31 +1,90 @@
 # handlers/verification.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import telebot
 from telebot import types
 import config
 from handlers.admin import is_admin
 from handlers.main_menu import send_main_menu
 
+# Membership checks are cached: the bot's own id and each channel's chat id for
+# the process lifetime, the bot's admin status per channel and positive
+# per-user results for a TTL. Channel checks for one user run in parallel.
+MEMBERSHIP_CACHE_TTL = 300   # seconds a verified user stays verified without re-checking
+BOT_ADMIN_CACHE_TTL = 600    # seconds between re-checks of the bot's admin rights
+MEMBERSHIP_WORKERS = 8
+MEMBERSHIP_CACHE_SIZE = 100000
+
+_executor = ThreadPoolExecutor(max_workers=MEMBERSHIP_WORKERS, thread_name_prefix="membership")
+_cache_lock = threading.Lock()
+_bot_id = None
+_chat_ids = {}          # channel username -> chat id
+_bot_admin_until = {}   # chat id -> expiry of a positive admin check
+_verified_until = {}    # user id -> expiry of a positive membership check
+
+def _get_bot_id(bot):
+    global _bot_id
+    if _bot_id is None:
+        _bot_id = bot.get_me().id
+    return _bot_id
+
+def _get_chat_id(bot, channel):
+    # Extract the channel username from the URL.
+    channel_username = channel.rstrip('/').split("/")[-1]
+    chat_id = _chat_ids.get(channel_username)
+    if chat_id is None:
+        chat_id = bot.get_chat("@" + channel_username).id
+        _chat_ids[channel_username] = chat_id
+    return chat_id
+
+def _bot_is_admin(bot, chat_id):
+    now = time.monotonic()
+    if _bot_admin_until.get(chat_id, 0) > now:
+        return True
+    bot_member = bot.get_chat_member(chat_id, _get_bot_id(bot))
+    if bot_member.status not in ["administrator", "creator"]:
+        return False
+    _bot_admin_until[chat_id] = now + BOT_ADMIN_CACHE_TTL
+    return True
+
+def _check_channel(bot, channel, user_id):
+    try:
+        chat_id = _get_chat_id(bot, channel)
+        # Ensure the bot is an admin in the channel (needed for reliable membership checking).
+        if not _bot_is_admin(bot, chat_id):
+            print(f"Bot is not admin in {channel}")
+            return False
+        # Check the user's membership status.
+        user_member = bot.get_chat_member(chat_id, user_id)
+        return user_member.status in ["member", "creator", "administrator"]
+    except Exception as e:
+        print(f"Error checking membership for {channel}: {e}")
+        return False
+
 def check_channel_membership(bot, user_id):
     """
     Check if a user is a member of all required channels.
+    Channels are checked concurrently and the check stops at the first failure.
+    A positive result is cached for MEMBERSHIP_CACHE_TTL seconds.
     """
-    for channel in config.REQUIRED_CHANNELS:
-        try:
-            # Extract the channel username from the URL.
-            channel_username = channel.rstrip('/').split("/")[-1]
-            chat = bot.get_chat("@" + channel_username)
-            # Ensure the bot is an admin in the channel (needed for reliable membership checking).
-            bot_member = bot.get_chat_member(chat.id, bot.get_me().id)
-            if bot_member.status not in ["administrator", "creator"]:
-                print(f"Bot is not admin in {channel}")
-                return False
-            # Check the user's membership status.
-            user_member = bot.get_chat_member(chat.id, user_id)
-            if user_member.status not in ["member", "creator", "administrator"]:
-                return False
-        except Exception as e:
-            print(f"Error checking membership for {channel}: {e}")
+    key = str(user_id)
+    if _verified_until.get(key, 0) > time.monotonic():
+        return True
+    futures = [_executor.submit(_check_channel, bot, channel, user_id) for channel in config.REQUIRED_CHANNELS]
+    for future in as_completed(futures):
+        if not future.result():
+            for other in futures:
+                other.cancel()
             return False
+    now = time.monotonic()
+    with _cache_lock:
+        if len(_verified_until) >= MEMBERSHIP_CACHE_SIZE:
+            for uid in [uid for uid, until in _verified_until.items() if until <= now]:
+                del _verified_until[uid]
+            if len(_verified_until) >= MEMBERSHIP_CACHE_SIZE:
+                _verified_until.clear()
+        _verified_until[key] = now + MEMBERSHIP_CACHE_TTL
     return True
 
 def send_verification_message(bot, message):
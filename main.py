@@ -1,27 +1,38 @@
-import telebot
+import io
+import tempfile
+from telebot.types import InputFile
 import config
 from datetime import datetime
-from db import init_db, add_user, get_user, claim_key_in_db, update_user_points, DATABASE
+from db import init_db, claim_key_in_db, update_user_points, restore_backup, write_backup, start_stats_reconciler, start_blob_gc
 from handlers.verification import send_verification_message, handle_verification_callback
 from handlers.main_menu import send_main_menu
-from handlers.referral import extract_referral_code, process_verified_referral, send_referral_menu, get_referral_link
+from handlers.referral import process_verified_referral, send_referral_menu, get_referral_link
 from handlers.rewards import send_rewards_menu, handle_platform_selection, claim_account
 from handlers.review import prompt_review, process_report
 from handlers.account_info import send_account_info
+from handlers.leaderboard import send_leaderboard
+from handlers.context import attach_user_context, user_context
 from handlers.admin import (
-    send_admin_menu, admin_callback_handler, is_admin, lend_points, 
+    send_admin_menu, admin_callback_handler, lend_points, 
     update_account_claim_cost, update_referral_bonus, 
-    generate_normal_key, generate_premium_key, add_key
+    generate_keys, MAX_KEYS_PER_GEN
 )
 from handlers.logs import log_event
+from handlers.broadcast import start_broadcast, resume_broadcasts
+from bot_client import get_bot
+from webhook import run_webhook
 
-# Initialize the bot object with your token
-bot = telebot.TeleBot(config.TOKEN, parse_mode="HTML")
+# Shared bot object (one pooled HTTP session for every module)
+bot = get_bot()
 
 
+@bot.middleware_handler(update_types=["message", "callback_query"])
+def request_context(bot_instance, update):
+    # Load (or create) the sender's row once per update; see handlers/context.py
+    attach_user_context(update)
+
 def check_if_banned(message):
-    user = get_user(str(message.from_user.id))
-    if user and user.get("banned", 0):
+    if user_context(message)["banned"]:
         bot.send_message(message.chat.id, "🚫 You are banned and cannot use this bot.")
         return True
     return False
@@ -32,19 +43,12 @@ def start_command(message):
         return
     print(f"[DEBUG] /start received from user: {message.from_user.id}")
     user_id = str(message.from_user.id)
-    user = get_user(user_id)
-    pending_ref = extract_referral_code(message)
-    if not user:
-        add_user(
-            user_id,
-            message.from_user.username or message.from_user.first_name,
-            datetime.now().strftime("%Y-%m-%d"),
-            pending_referrer=pending_ref
-        )
-        user = get_user(user_id)
+    # New users were created by the context middleware, with the referral code of this /start
+    context = user_context(message)
+    user = context["user"]
     if user.get("pending_referrer"):
         process_verified_referral(user_id, bot)
-    if is_admin(get_user(user_id)):
+    if context["admin"]:
         bot.send_message(message.chat.id, "✨ Welcome, Admin/Owner! You are automatically verified! ✨")
         send_main_menu(bot, message)
         return
@@ -90,6 +94,12 @@ def redeem_command(message):
     bot.reply_to(message, result)
     log_event(bot, "key_claim", f"User {user_id} redeemed key {key}. Result: {result}", user=message.from_user)
 
+@bot.message_handler(commands=["leaderboard", "top"])
+def leaderboard_command(message):
+    if check_if_banned(message):
+        return
+    send_leaderboard(bot, message.chat.id, message.from_user.id)
+
 @bot.message_handler(commands=["broadcast"])
 def broadcast_command(message):
     # Only allow owners to use the broadcast command.
@@ -105,28 +115,9 @@ def broadcast_command(message):
 
     broadcast_text = parts[1]
 
-    # Retrieve all user Telegram IDs from the database.
-    from db import get_connection
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT telegram_id FROM users")
-    rows = c.fetchall()
-    c.close()
-    conn.close()
-
-    count = 0
-    failed = 0
-    for row in rows:
-        try:
-            # Since our connection uses sqlite3.Row, access the column by its key.
-            user_id = row["telegram_id"]
-            bot.send_message(user_id, broadcast_text)
-            count += 1
-        except Exception as e:
-            failed += 1
-            print(f"Error sending broadcast to {user_id}: {e}")
-
-    bot.reply_to(message, f"Broadcast sent to {count} users; failed for {failed} users.")
+    # Runs in the background at a controlled rate; progress is posted to this chat
+    job_id = start_broadcast(bot, message.from_user.id, message.chat.id, broadcast_text)
+    bot.reply_to(message, f"Broadcast #{job_id} started.")
 
 @bot.message_handler(func=lambda message: message.reply_to and message.reply_to.text == "⚖️ Your report has been responded to by an admin.")
 def forward_user_reply_to_admin(message):
@@ -248,39 +239,37 @@ def gen_command(message):
             bot.reply_to(message, "Points must be a number.")
             return
 
-    generated = []
-    if key_type == "normal":
-        for _ in range(qty):
-            key = generate_normal_key() 
-            add_key(key, "normal", default_points)
-            generated.append(key)
-    elif key_type == "premium":
-        for _ in range(qty):
-            key = generate_premium_key() 
-            add_key(key, "premium", default_points)
-            generated.append(key)
-    else:
+    if key_type not in ("normal", "premium"):
         bot.reply_to(message, "Key type must be either 'normal' or 'premium'.")
         return
+    if qty < 1 or qty > MAX_KEYS_PER_GEN:
+        bot.reply_to(message, f"Quantity must be between 1 and {MAX_KEYS_PER_GEN}.")
+        return
+
+    generated = generate_keys(key_type, qty, default_points, admin_id=message.from_user.id)
 
-    # Build response
-    if generated:
+    # Small batches go inline; anything that would not fit one message goes as a file
+    if qty <= 100:
         text = (
             "╔═══━━━─── • ───━━━═══╗\n"
             "     🎁 𝗦𝗛𝗔𝗗𝗢𝗪 𝗩𝗔𝗨𝗟𝗧 🎁\n"
             "     ✨ Redeem Keys ✨\n"
             "╚═══━━━─── • ───━━━═══╝\n\n"
         )
-        for key in generated:
-            text += f"⟡ <code>{key}</code>\n"
+        text += "".join(f"⟡ <code>{key}</code>\n" for key in generated)
         text += "\n╭─━━━━━━━━━━━━─╮\n"
         text += "🤖 Redeem your code:\n"
         text += "➥ /redeem KEY\n"
         text += "╰─━━━━━━━━━━━━─╯"
-    else:
-        text = "No keys generated."
-
-    bot.reply_to(message, text, parse_mode="HTML")
+        if len(text) <= 4096:
+            bot.reply_to(message, text, parse_mode="HTML")
+            return
+    # Too long for one message: send the keys as a text file, one per line
+    file_stream = io.BytesIO("\n".join(generated).encode("utf-8"))
+    file_stream.name = f"{key_type}_keys_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    bot.send_document(message.chat.id, file_stream,
+                      caption=f"🎁 {len(generated)} {key_type} keys ({default_points} pts each). Redeem with /redeem KEY",
+                      reply_to_message_id=message.message_id)
 
 
 @bot.message_handler(commands=["recover"])
@@ -289,16 +278,16 @@ def recover_command(message):
     if str(message.from_user.id) not in config.OWNERS:
         bot.reply_to(message, "🚫 You are not authorized.")
         return
-    # This command must be sent in reply to a document (the bot DB file)
+    # This command must be sent in reply to a document (a /get backup or the bot DB file)
     if not message.reply_to_message or not message.reply_to_message.document:
-        bot.reply_to(message, "Please reply to a valid bot database file to recover it.")
+        bot.reply_to(message, "Please reply to a /get backup or a bot database file to recover it.")
         return
     try:
         file_info = bot.get_file(message.reply_to_message.document.file_id)
         downloaded_file = bot.download_file(file_info.file_path)
-        with open(DATABASE, "wb") as f:
-            f.write(downloaded_file)
-        bot.reply_to(message, "✅ Database recovered successfully.")
+        # The /get zip (database and cookie blobs) or a bare bot.db
+        blobs = restore_backup(downloaded_file)
+        bot.reply_to(message, f"✅ Database recovered successfully ({blobs} cookie files).")
     except Exception as e:
         bot.reply_to(message, f"Error recovering database: {e}")
 
@@ -309,8 +298,11 @@ def get_command(message):
         bot.reply_to(message, "🚫 You are not authorized.")
         return
     try:
-        with open(DATABASE, "rb") as f:
-            bot.send_document(message.chat.id, f)
+        # One zip with the database and the cookie blobs it references
+        with tempfile.TemporaryFile() as f:
+            write_backup(f)
+            f.seek(0)
+            bot.send_document(message.chat.id, InputFile(f, f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"))
     except Exception as e:
         bot.reply_to(message, f"Error sending database file: {e}")
 
@@ -348,6 +340,8 @@ def callback_menu(call):
         bot.register_next_step_handler(msg, lambda m: process_report(bot, m))
     elif call.data == "menu_support":
         support_command(bot, call.message)
+    elif call.data == "menu_leaderboard":
+        send_leaderboard(bot, call.message.chat.id, call.from_user.id)
     elif call.data == "menu_admin":
         send_admin_menu(bot, call.message)
     else:
@@ -364,5 +358,17 @@ def callback_reward(call):
     platform_name = call.data.split("reward_")[1]
     handle_platform_selection(bot, call, platform_name)
 
-bot.polling(non_stop=True)
+@bot.callback_query_handler(func=lambda call: call.data.startswith("claim_") and not call.data.startswith("claim_report"))
+def callback_claim(call):
+    platform_name = call.data.split("claim_", 1)[1]
+    bot.answer_callback_query(call.id)
+    claim_account(bot, call, platform_name)
+
+init_db()
+start_stats_reconciler()
+start_blob_gc()
+resume_broadcasts(bot)
+if not (config.WEBHOOK_ENABLED and run_webhook(bot)):
+    bot.remove_webhook()
+    bot.polling(non_stop=True)
     
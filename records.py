@@ -0,0 +1,114 @@
+"""
+Row types returned by db.py. Each is a __slots__ class, so cached rows cost a
+fraction of a dict and fields are plain attribute reads (user.points).
+
+For the handlers written against dict rows they also answer the read side
+of the mapping protocol: user["points"], user.get("banned", 0) and dict(user)
+behave as they did. Fields a query did not select read as None through
+attributes and are absent through the mapping methods.
+
+Records handed out by the caches in db.py are shared: treat them as read-only
+and use replace() to derive a changed copy.
+"""
+
+
+class Record:
+    __slots__ = ()
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Build a record from a sqlite3.Row (or any mapping with keys()).
+        """
+        record = cls.__new__(cls)
+        for name, value in zip(row.keys(), row):
+            setattr(record, name, value)
+        return record
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        # Only reached for slots that were never set (columns not selected)
+        if name in type(self).__slots__:
+            return None
+        raise AttributeError(name)
+
+    def keys(self):
+        names = []
+        for name in type(self).__slots__:
+            try:
+                object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+            names.append(name)
+        return names
+
+    def __getitem__(self, name):
+        if name in type(self).__slots__:
+            try:
+                return object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+    def replace(self, **fields):
+        """
+        A copy with the given fields changed.
+        """
+        record = type(self).__new__(type(self))
+        for name in type(self).__slots__:
+            try:
+                setattr(record, name, object.__getattribute__(self, name))
+            except AttributeError:
+                pass
+        for name, value in fields.items():
+            setattr(record, name, value)
+        return record
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.items() == other.items()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.items())
+        return f"{type(self).__name__}({fields})"
+
+
+class User(Record):
+    __slots__ = ("telegram_id", "username", "join_date", "points", "referrals", "banned",
+                 "pending_referrer", "verified", "blocked_bot")
+
+
+class Platform(Record):
+    __slots__ = ("platform_name", "stock", "price", "platform_type", "stock_count")
+
+
+class StockItem(Record):
+    __slots__ = ("id", "platform_name", "item_type", "content", "content_hash", "claimed",
+                 "claimed_by", "claimed_at", "added_at")
+
+
+class Key(Record):
+    __slots__ = ("key", "type", "points", "claimed", "claimed_by", "timestamp")
+
+
+class Admin(Record):
+    __slots__ = ("user_id", "username", "role", "banned")
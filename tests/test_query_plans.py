@@ -0,0 +1,121 @@
+"""
+Every SQL statement written in db.py, main.py and handlers/ must reach the
+large tables through an index search. Statements are collected from the
+source, so new queries are checked without being listed anywhere.
+"""
+import ast
+import glob
+import os
+import sqlite3
+
+import pytest
+
+import db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = [os.path.join(ROOT, "db.py"), os.path.join(ROOT, "main.py")] + \
+    sorted(glob.glob(os.path.join(ROOT, "handlers", "*.py")))
+DML = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+# Tables that grow with the user base. A SCAN of one of them (of the table or
+# of a whole index, "SCAN t USING INDEX ...") visits every row.
+LARGE_TABLES = ("users", "reports", "referrals", "keys", "stock_items")
+
+# Scans that are intended: maintenance jobs and one-off migrations that have
+# to visit every row, and scans bounded by a LIMIT. Keep each entry justified.
+ALLOWED_SCANS = {
+    # reconcile_stats: recounts the dashboard counters every few hours
+    "SELECT COUNT(*), COALESCE(SUM(banned != 0), 0), COALESCE(SUM(verified != 0), 0), COALESCE(SUM(points), 0) "
+    "FROM users",
+    # get_keys: export of every key
+    "SELECT * FROM keys",
+    # _load_leaderboard: the top LEADERBOARD_CACHE_SIZE rows of idx_users_points
+    "SELECT telegram_id, username, points FROM users ORDER BY points DESC LIMIT ?",
+    # collect_stock_blobs: blob GC, walks the partial index of blob-backed cookies
+    "SELECT DISTINCT content_hash FROM stock_items WHERE item_type = 'cookie' AND content IS NULL "
+    "AND (claimed = 0 OR claimed_at > ?)",
+    # _move_cookies_to_blobs: migration batches over a partial index that it empties
+    "SELECT id, content, content_hash FROM stock_items WHERE item_type = 'cookie' AND content IS NOT NULL "
+    "AND content_hash IS NOT NULL LIMIT ?",
+}
+
+
+def full_scans(conn, sql, params):
+    """
+    The plan details of sql that scan a large table.
+    """
+    problems = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        words = row["detail"].split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in LARGE_TABLES:
+            problems.append(row["detail"])
+    return problems
+
+
+def _sql_text(node):
+    """
+    The SQL of a string literal, f-string (interpolations become '?', which
+    fits the "IN ({placeholders})" idiom) or concatenation of those, and
+    whether it was an f-string; None for anything computed at run time.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value, False
+    if isinstance(node, ast.JoinedStr):
+        return "".join(part.value if isinstance(part, ast.Constant) else "?" for part in node.values), True
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = _sql_text(node.left), _sql_text(node.right)
+        if left is not None and right is not None:
+            return left[0] + right[0], left[1] or right[1]
+    return None
+
+
+def collect_statements():
+    statements = {}
+    for path in SOURCES:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ("execute", "executemany") and node.args):
+                continue
+            text = _sql_text(node.args[0])
+            if text is None:
+                continue
+            sql = " ".join(text[0].split())
+            if sql.split(" ", 1)[0].upper() in DML:
+                statements.setdefault(sql, (f"{os.path.relpath(path, ROOT)}:{node.lineno}", text[1]))
+    return statements
+
+
+STATEMENTS = collect_statements()
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    db.DATABASE = str(tmp_path_factory.mktemp("db") / "bot.db")
+    db.close_all_connections()
+    db.init_db()
+    yield
+    db.close_all_connections()
+
+
+def test_statements_collected():
+    assert len(STATEMENTS) > 50
+
+
+@pytest.mark.parametrize("sql", sorted(STATEMENTS), ids=lambda sql: STATEMENTS[sql][0])
+def test_no_full_scan_of_large_tables(database, sql):
+    location, templated = STATEMENTS[sql]
+    params = (None,) * sql.count("?")
+    try:
+        problems = full_scans(db.get_connection(), sql, params)
+    except sqlite3.OperationalError:
+        # An f-string that builds more than a placeholder list (e.g. a SET
+        # clause) cannot be planned from source; only allowed off the large tables.
+        words = set(sql.replace(",", " ").split())
+        if templated and not words & set(LARGE_TABLES):
+            pytest.skip(f"{location}: dynamic SQL on a small table")
+        raise
+    if sql in ALLOWED_SCANS:
+        return
+    assert not problems, f"{location} scans a large table: {problems[0]}"
@@ -0,0 +1,122 @@
+"""
+In-memory anti-flood limits applied to every update before it is
+dispatched: one token bucket per user and one per (user, command). Rejected
+updates never reach a handler or the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+THROTTLE_USER = (2.0, 10)        # (tokens per second, burst) for everything a user sends
+THROTTLE_COMMAND = (1.0, 5)      # default per-command bucket
+# Stricter buckets for the expensive entry points (command or callback prefix)
+THROTTLE_COMMANDS = {
+    "/start": (0.2, 2),
+    "verify": (0.2, 2),
+    "claim_": (0.5, 2),
+    "/redeem": (0.3, 3),
+}
+THROTTLE_MAX_KEYS = 50000        # buckets kept; least recently used are evicted
+THROTTLE_OTHER_COMMAND = "other"  # shared key for commands without a handler
+THROTTLE_CALLBACK_TEXT = "⏳ Slow down a little."
+
+
+def command_key(update, known=None):
+    """
+    The command an update invokes: '/name' for command messages, the data
+    prefix (up to and including the first '_') for callbacks, else None.
+    If known (a set of '/name') is given, any other command maps to
+    THROTTLE_OTHER_COMMAND, so made-up commands cannot grow the key space.
+    """
+    message = getattr(update, "message", None)
+    if message is not None:
+        text = getattr(message, "text", None) or ""
+        if text.startswith("/"):
+            command = text.split()[0].split("@")[0].lower()
+            if known is not None and command not in known:
+                return THROTTLE_OTHER_COMMAND
+            return command
+        return None
+    call = getattr(update, "callback_query", None)
+    if call is not None:
+        data = call.data or ""
+        prefix, sep, _ = data.partition("_")
+        return prefix + sep
+    return None
+
+
+class Throttle:
+    """
+    Token buckets keyed by user / (user, command), in an LRU of bounded size.
+    known_commands, once anything is registered, limits the command keys to
+    the bot's own commands (see command_key).
+    """
+
+    def __init__(self, user_limit=THROTTLE_USER, command_limit=THROTTLE_COMMAND,
+                 commands=THROTTLE_COMMANDS, max_keys=THROTTLE_MAX_KEYS):
+        self.known_commands = None
+        self.user_limit = user_limit
+        self.command_limit = command_limit
+        self.commands = commands
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()   # key -> [tokens, last refill]
+        self.counters = {"allowed": 0, "throttled_messages": 0, "throttled_callbacks": 0, "evicted": 0}
+        self.throttled_by_command = {}
+        self._lock = threading.Lock()
+
+    def _take(self, key, limit, now):
+        rate, burst = limit
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [burst, now]
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+                self.counters["evicted"] += 1
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def allow(self, user_id, command=None):
+        """
+        Take one token from the user's command bucket (if any) and their user
+        bucket. Returns False if either is empty.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if command is not None:
+                limit = self.commands.get(command, self.command_limit)
+                if not self._take((user_id, command), limit, now):
+                    self.throttled_by_command[command] = self.throttled_by_command.get(command, 0) + 1
+                    return False
+            return self._take(user_id, self.user_limit, now)
+
+    def register_command(self, command):
+        with self._lock:
+            if self.known_commands is None:
+                self.known_commands = set()
+            self.known_commands.add("/" + command.lower())
+
+    def allow_update(self, update, user):
+        command = command_key(update, self.known_commands)
+        if self.allow(user.id, command):
+            with self._lock:
+                self.counters["allowed"] += 1
+            return True
+        with self._lock:
+            if getattr(update, "callback_query", None) is not None:
+                self.counters["throttled_callbacks"] += 1
+            else:
+                self.counters["throttled_messages"] += 1
+        return False
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            counters["buckets"] = len(self.buckets)
+            counters["by_command"] = dict(self.throttled_by_command)
+        return counters
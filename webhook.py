@@ -0,0 +1,188 @@
+"""
+Webhook update intake: a small stdlib HTTP server that accepts Telegram
+updates, checks the secret token (generated at startup when WEBHOOK_SECRET is empty)
+and queues them for a fixed pool of worker
+threads, which feed them to bot.process_new_updates.
+
+Local test (WEBHOOK_ENABLED = True, WEBHOOK_URL = ""):
+    curl -X POST http://127.0.0.1:8443/webhook \
+         -H "X-Telegram-Bot-Api-Secret-Token: <WEBHOOK_SECRET>" \
+         -H "Content-Type: application/json" -d @update.json
+"""
+import hmac
+import json
+import queue
+import secrets
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import telebot
+import config
+from db import rollback_open_transaction
+
+WEBHOOK_MAX_BODY = 1024 * 1024   # bytes; Telegram updates are far smaller
+WEBHOOK_DRAIN_TIMEOUT = 30       # seconds to finish queued updates on shutdown
+
+
+class _UpdateHandler(BaseHTTPRequestHandler):
+    server_version = "SRewardsWebhook"
+
+    def _reply(self, code, text=""):
+        body = text.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._reply(200, json.dumps(self.server.intake.stats()))
+        else:
+            self._reply(404)
+
+    def do_POST(self):
+        intake = self.server.intake
+        if self.path != intake.path:
+            self._reply(404)
+            return
+        secret = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(secret.encode(), intake.secret.encode()):
+            intake.count("rejected")
+            self._reply(403)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length <= 0 or length > WEBHOOK_MAX_BODY:
+            intake.count("rejected")
+            self._reply(400)
+            return
+        try:
+            update = telebot.types.Update.de_json(json.loads(self.rfile.read(length)))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # Not JSON, or JSON that is not an update
+            update = None
+        if update is None:
+            intake.count("rejected")
+            self._reply(400)
+            return
+        if not intake.submit(update):
+            # Queue full: Telegram retries non-2xx deliveries later
+            self._reply(503)
+            return
+        self._reply(200)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookServer:
+    """
+    HTTP intake plus a bounded queue drained by `workers` threads. stop()
+    stops accepting, finishes whatever is queued and joins the workers.
+    Every POST must carry the secret; without a configured one a random
+    secret is generated, which run_webhook registers with Telegram.
+    """
+
+    def __init__(self, bot, host=config.WEBHOOK_HOST, port=config.WEBHOOK_PORT, path=config.WEBHOOK_PATH,
+                 secret=config.WEBHOOK_SECRET, workers=config.WEBHOOK_WORKERS, queue_size=config.WEBHOOK_QUEUE_SIZE):
+        self.bot = bot
+        self.path = path
+        self.secret = secret or secrets.token_urlsafe(32)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.counters = {"received": 0, "processed": 0, "failed": 0, "rejected": 0, "overflow": 0}
+        self._lock = threading.Lock()
+        self._accepting = True
+        self.httpd = ThreadingHTTPServer((host, port), _UpdateHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.intake = self
+        self.workers = [threading.Thread(target=self._work, name=f"webhook-{i}", daemon=True)
+                        for i in range(workers)]
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def submit(self, update):
+        if not self._accepting:
+            self.count("overflow")
+            return False
+        try:
+            self.queue.put_nowait(update)
+        except queue.Full:
+            self.count("overflow")
+            return False
+        self.count("received")
+        return True
+
+    def _work(self):
+        while True:
+            update = self.queue.get()
+            if update is None:
+                return
+            try:
+                self.bot.process_new_updates([update])
+                self.count("processed")
+            except Exception as e:
+                self.count("failed")
+                print(f"Error processing webhook update: {e}")
+            finally:
+                rollback_open_transaction()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters["queued"] = self.queue.qsize()
+        return counters
+
+    def serve_forever(self):
+        for worker in self.workers:
+            worker.start()
+        host, port = self.httpd.server_address[:2]
+        print(f"Webhook server listening on {host}:{port}{self.path}")
+        self.httpd.serve_forever()
+
+    def stop(self, timeout=WEBHOOK_DRAIN_TIMEOUT):
+        self._accepting = False
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout)
+        # Updates handed to per-user lanes (dispatcher.LaneBot) finish there
+        dispatcher = getattr(self.bot, "dispatcher", None)
+        if dispatcher is not None:
+            dispatcher.stop(timeout)
+
+
+def run_webhook(bot):
+    """
+    Register the webhook (unless WEBHOOK_URL is empty) and serve updates
+    until SIGINT/SIGTERM. Returns False if registration failed, so the caller
+    can fall back to polling.
+    """
+    server = WebhookServer(bot)
+    if config.WEBHOOK_URL:
+        try:
+            bot.remove_webhook()
+            bot.set_webhook(url=config.WEBHOOK_URL, secret_token=server.secret,
+                            max_connections=config.WEBHOOK_WORKERS)
+        except Exception as e:
+            print(f"Could not register webhook: {e}")
+            server.httpd.server_close()
+            return False
+    elif not config.WEBHOOK_SECRET:
+        # Not registered, so nobody else knows the generated secret
+        print(f"Webhook secret for this run: {server.secret}")
+
+    def shutdown(signum, frame):
+        # httpd.shutdown() waits for serve_forever() to return, so not from this thread
+        threading.Thread(target=server.stop, name="webhook-stop").start()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    server.serve_forever()
+    return True